@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException, status, Header, Depends # Đã có Depends
+from fastapi import APIRouter, HTTPException, status, Header, Depends, Response # Đã có Depends
+from fastapi.responses import StreamingResponse
 from typing import Optional
+import json
 from app.models.schemas import ChatRequest, ChatResponse
 from app.services.gemini import GeminiService
+from app.services.response_cache import response_cache, cache_bypassed
+from app.services.single_flight import gemini_flights
 from app.core.config import get_settings
 from app.core.security import verify_token # <<< Import hàm verify_token
 # from app.models.user import User # Có thể cần nếu dùng thông tin user chi tiết
@@ -9,28 +13,42 @@ from app.core.security import verify_token # <<< Import hàm verify_token
 router = APIRouter()
 settings = get_settings()
 
+CHAT_ERROR_RESPONSES = {
+    status.HTTP_400_BAD_REQUEST: {"description": "Bad request, such as invalid parameters"},
+    status.HTTP_401_UNAUTHORIZED: {"description": "Authentication required or invalid token"}, # Cập nhật mô tả 401
+    status.HTTP_403_FORBIDDEN: {"description": "Permission denied for the operation"},
+    status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Quota or rate limit exceeded"},
+    status.HTTP_500_INTERNAL_SERVER_ERROR: {"description": "Internal server error"},
+    status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Service temporarily unavailable or Auth service unavailable"} # Cập nhật mô tả 503
+}
+
+
+def _sse(data: dict, event: str | None = None) -> str:
+    """Format one Server-Sent Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.post(
     # Giữ nguyên path, response_model, summary
     "/chat/generate-text", # Giữ nguyên endpoint để tránh breaking change API
     response_model=ChatResponse,
     summary="Generate Text Response using Gemini model (Auth Required)", # Cập nhật summary
-    responses={
-        status.HTTP_400_BAD_REQUEST: {"description": "Bad request, such as invalid parameters"},
-        status.HTTP_401_UNAUTHORIZED: {"description": "Authentication required or invalid token"}, # Cập nhật mô tả 401
-        status.HTTP_403_FORBIDDEN: {"description": "Permission denied for the operation"},
-        status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Quota or rate limit exceeded"},
-        status.HTTP_500_INTERNAL_SERVER_ERROR: {"description": "Internal server error"},
-        status.HTTP_503_SERVICE_UNAVAILABLE: {"description": "Service temporarily unavailable or Auth service unavailable"} # Cập nhật mô tả 503
-    }
+    responses=CHAT_ERROR_RESPONSES
 )
 async def generate_chat_response(
     request_body: ChatRequest,
+    response: Response,
     x_google_api_key: Optional[str] = Header(None, alias="X-Google-API-Key"),
+    cache_control: Optional[str] = Header(None, alias="Cache-Control"),
     current_user: dict = Depends(verify_token) # <<< Thêm dependency xác thực
 ):
     """
     Receives a user message and optional chat history, then returns
     a text response generated by the Gemini model.
+
+    Identical requests are served from the response cache, and identical
+    concurrent requests share one upstream call, unless the request sends
+    `Cache-Control: no-cache`.
     """
     try:
         # Sử dụng API key từ header nếu có, nếu không sẽ dùng từ settings
@@ -40,26 +58,115 @@ async def generate_chat_response(
              # Nên có kiểm tra key tồn tại và trả lỗi rõ ràng
              raise HTTPException(status_code=500, detail="Gemini API key is not configured on the server.")
 
-        # Initialize the Gemini service
+        use_cache = response_cache.enabled and not cache_bypassed(cache_control)
+        cache_key = response_cache.chat_key(
+            request_body.model or settings.GEMINI_CHAT_MODEL_NAME,
+            request_body.history,
+            request_body.message
+        )
+        if use_cache:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                response.headers["X-Cache"] = "HIT"
+                return ChatResponse(**cached)
+
+        async def generate() -> ChatResponse:
+            # Initialize the Gemini service
+            gemini_service = GeminiService(api_key=api_key)
+
+            # Generate a response
+            response_text, model_used = await gemini_service.generate_text_response(
+                message=request_body.message,
+                history=request_body.history,
+                model=request_body.model
+            )
+
+            chat_response = ChatResponse(
+                response_text=response_text,
+                model_used=model_used
+            )
+            if use_cache:
+                await response_cache.set(cache_key, chat_response.model_dump())
+            return chat_response
+
+        # Các request giống hệt nhau đến cùng lúc chỉ gọi Gemini một lần, kể cả khi cache tắt hoặc bị bỏ qua
+        chat_response = await gemini_flights.do(gemini_flights.key(cache_key, api_key), generate)
+        if use_cache:
+            response.headers["X-Cache"] = "MISS"
+        return chat_response
+    except HTTPException as http_exc:
+        # Re-raise HTTPExceptions raised by the service
+        raise http_exc
+    except Exception as e:
+        # Catch any other unexpected errors during chat generation
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred during chat generation: {e}"
+        )
+
+
+@router.post(
+    "/chat/stream",
+    summary="Stream Text Response from Gemini as Server-Sent Events (Auth Required)",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Stream of `data: {\"text\": ...}` events, then `event: done` with `model_used`. "
+                           "Errors after the stream started are sent as `event: error`.",
+            "content": {"text/event-stream": {}},
+        },
+        **CHAT_ERROR_RESPONSES
+    }
+)
+async def stream_chat_response(
+    request_body: ChatRequest,
+    x_google_api_key: Optional[str] = Header(None, alias="X-Google-API-Key"),
+    current_user: dict = Depends(verify_token)
+):
+    """
+    Same input as /chat/generate-text, but streams the answer token by token
+    so the client sees the first chunk after the model's first-token latency.
+    """
+    api_key = x_google_api_key or settings.GOOGLE_AI_STUDIO_API_KEY
+    if not api_key:
+        raise HTTPException(status_code=500, detail="Gemini API key is not configured on the server.")
+
+    try:
         gemini_service = GeminiService(api_key=api_key)
-        
-        # Generate a response
-        response_text, model_used = await gemini_service.generate_text_response(
+        model_used = request_body.model or gemini_service.model_id
+        chunks = gemini_service.stream_text_response(
             message=request_body.message,
             history=request_body.history,
             model=request_body.model
         )
-        
-        return ChatResponse(
-            response_text=response_text,
-            model_used=model_used
-        )
+        # Lấy chunk đầu tiên trước khi gửi header, để lỗi (API key, quota, safety...) vẫn trả về đúng HTTP status
+        try:
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = None
     except HTTPException as http_exc:
-        # Re-raise HTTPExceptions raised by the service
         raise http_exc
     except Exception as e:
-        # Catch any other unexpected errors during chat generation
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An unexpected error occurred during chat generation: {e}"
-        )
\ No newline at end of file
+        )
+
+    async def event_stream():
+        try:
+            if first_chunk is not None:
+                yield _sse({"text": first_chunk})
+                async for chunk in chunks:
+                    yield _sse({"text": chunk})
+            yield _sse({"model_used": model_used}, event="done")
+        except HTTPException as http_exc:
+            # Header đã được gửi, chỉ có thể báo lỗi qua một event
+            yield _sse({"status_code": http_exc.status_code, "detail": http_exc.detail}, event="error")
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
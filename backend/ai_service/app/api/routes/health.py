@@ -1,9 +1,13 @@
 from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
 import time
-import psutil
 from app.core.config import get_settings
-from app.models.schemas import HealthResponse
-import google.generativeai as genai
+from app.models.schemas import HealthResponse, LivenessResponse, ReadinessResponse
+from app.services.gemini import gemini_limiter
+from app.services.gemini_clients import gemini_clients
+from app.services.response_cache import response_cache
+from app.services.single_flight import gemini_flights
+from app.services.health_probe import health_probe
 
 router = APIRouter()
 settings = get_settings()
@@ -22,35 +26,67 @@ async def health_check():
     Health check endpoint that returns:
     - Service status
     - Uptime
-    - Gemini API connectivity status
-    - System resource usage stats
+    - Gemini API connectivity status (last background probe)
+    - System resource usage stats (last background probe)
+    - Gemini call limiter metrics (queue depth, in-flight calls)
+    - Gemini client registry hit/miss counters
+    - Response cache hit rate
+    - Single-flight (request coalescing) counters
     """
     # Calculate uptime
     uptime_seconds = int(time.time() - START_TIME)
     hours, remainder = divmod(uptime_seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
     uptime_formatted = f"{hours:02}:{minutes:02}:{seconds:02}"
-    
-    # Check if Gemini API is reachable
-    gemini_api_status = False
-    try:
-        if settings.GOOGLE_AI_STUDIO_API_KEY:
-            genai.configure(api_key=settings.GOOGLE_AI_STUDIO_API_KEY)
-            models = genai.list_models()
-            gemini_api_status = any("gemini" in model.name.lower() for model in models)
-    except Exception:
-        gemini_api_status = False
-    
-    # Collect system stats
-    system_stats = {
-        "cpu_percent": psutil.cpu_percent(),
-        "memory_percent": psutil.virtual_memory().percent,
-        "disk_usage": psutil.disk_usage('/').percent
-    }
-    
+
+    # Gemini connectivity và system stats lấy từ snapshot của background probe,
+    # không gọi Gemini trong request
+    probe = health_probe.snapshot()
+
     return HealthResponse(
         status="healthy",
         uptime=uptime_formatted,
-        gemini_api=gemini_api_status,
-        system_stats=system_stats
-    )
\ No newline at end of file
+        gemini_api=probe["gemini_api"],
+        gemini_checked_at=probe["checked_at"],
+        system_stats=probe["system_stats"],
+        gemini_calls=gemini_limiter.stats(),
+        gemini_clients=gemini_clients.stats(),
+        response_cache=response_cache.stats(),
+        gemini_flights=gemini_flights.stats()
+    )
+
+
+@router.get(
+    "/health/live",
+    response_model=LivenessResponse,
+    summary="Liveness probe: the process is up and serving requests",
+    status_code=status.HTTP_200_OK
+)
+async def liveness():
+    """Cheap liveness check with no upstream or system calls."""
+    return LivenessResponse(status="ok")
+
+
+@router.get(
+    "/health/ready",
+    response_model=ReadinessResponse,
+    summary="Readiness probe: Gemini was reachable at the last background probe",
+    responses={status.HTTP_503_SERVICE_UNAVAILABLE: {"model": ReadinessResponse, "description": "Gemini unreachable or probe stale"}}
+)
+async def readiness():
+    """
+    Returns 200 when the last background probe reached Gemini and is recent,
+    otherwise 503. Never calls Gemini itself.
+    """
+    probe = health_probe.snapshot()
+    ready = probe["gemini_api"] and health_probe.is_fresh()
+    body = ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        gemini_api=probe["gemini_api"],
+        gemini_error=probe["gemini_error"],
+        gemini_latency_ms=probe["gemini_latency_ms"],
+        checked_at=probe["checked_at"]
+    )
+    if not ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body.model_dump())
+    return body
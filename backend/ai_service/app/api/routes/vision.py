@@ -1,8 +1,10 @@
 from fastapi import Depends
-from fastapi import APIRouter, HTTPException, status, Header, File, UploadFile, Form
+from fastapi import APIRouter, HTTPException, status, Header, File, UploadFile, Form, Response
 from typing import Optional
 from app.models.schemas import VisionResponse
 from app.services.gemini import GeminiService
+from app.services.response_cache import response_cache, cache_bypassed
+from app.services.single_flight import gemini_flights
 from app.core.config import get_settings
 from app.core.security import verify_token
 
@@ -23,15 +25,20 @@ settings = get_settings()
     }
 )
 async def extract_text_from_image(
+    response: Response,
     file: UploadFile = File(...),
     prompt: Optional[str] = Form(None),
     model: Optional[str] = Form(None),
     x_google_api_key: Optional[str] = Header(None, alias="X-Google-API-Key"),
+    cache_control: Optional[str] = Header(None, alias="Cache-Control"),
     current_user: dict = Depends(verify_token) # <<< Thêm dependency xác thực
 ):
     """
     Receives an image file and optional custom prompt, then extracts text 
     from the image using Gemini Vision.
+
+    Results are cached by (model, prompt, image content hash) unless the
+    request sends `Cache-Control: no-cache`.
     """
     try:
         # Validate content type
@@ -59,16 +66,36 @@ async def extract_text_from_image(
              # Nên có kiểm tra key tồn tại và trả lỗi rõ ràng
              raise HTTPException(status_code=500, detail="Gemini API key is not configured on the server.")
 
-        # Initialize the Gemini service
-        gemini_service = GeminiService(api_key=api_key)
-        
-        # Extract text from the image
-        extracted_text, model_used = await gemini_service.extract_text_from_image(
-            image_content=image_content,
-            model=model,
-            prompt=prompt
+        use_cache = response_cache.enabled and not cache_bypassed(cache_control)
+        cache_key = response_cache.vision_key(
+            model or settings.GEMINI_VISION_MODEL_NAME,
+            prompt or "",
+            image_content
         )
-        
+        cached = await response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            response.headers["X-Cache"] = "HIT"
+            extracted_text, model_used = cached["extracted_text"], cached["model_used"]
+        else:
+            async def extract() -> tuple[str, str]:
+                # Initialize the Gemini service
+                gemini_service = GeminiService(api_key=api_key)
+
+                # Extract text from the image
+                result = await gemini_service.extract_text_from_image(
+                    image_content=image_content,
+                    model=model,
+                    prompt=prompt
+                )
+                if use_cache:
+                    await response_cache.set(cache_key, {"extracted_text": result[0], "model_used": result[1]})
+                return result
+
+            # Cùng một ảnh + prompt gửi đồng thời chỉ gọi Gemini một lần, kể cả khi cache tắt hoặc bị bỏ qua
+            extracted_text, model_used = await gemini_flights.do(gemini_flights.key(cache_key, api_key), extract)
+            if use_cache:
+                response.headers["X-Cache"] = "MISS"
+
         return VisionResponse(
             filename=file.filename,
             content_type=file.content_type,
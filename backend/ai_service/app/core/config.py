@@ -17,11 +17,42 @@ class Settings(BaseSettings):
     GOOGLE_AI_STUDIO_API_KEY: str = ""
     GEMINI_VISION_MODEL_NAME: str = "gemini-2.0-flash"
     GEMINI_CHAT_MODEL_NAME: str = "gemini-2.5-pro-exp-03-25"
+    # Giới hạn số lời gọi Gemini đồng thời trên mỗi worker
+    GEMINI_MAX_CONCURRENT_CALLS: int = 32
+    # Dùng API async của SDK; nếu False (hoặc SDK không hỗ trợ) sẽ chạy API sync trên thread pool
+    GEMINI_USE_ASYNC_SDK: bool = True
+    GEMINI_THREAD_POOL_SIZE: int = 16
+    # Registry client/model theo API key (LRU)
+    GEMINI_CLIENT_CACHE_MAX_KEYS: int = 256
+    GEMINI_MODEL_CACHE_MAX_PER_KEY: int = 8
+
+    # Response cache cho chat/vision (exact match)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    RESPONSE_CACHE_USE_REDIS: bool = True # Chỉ có tác dụng khi REDIS_URL được cấu hình
+
+    # Background health probe (Gemini reachability + system stats)
+    HEALTH_PROBE_INTERVAL_SECONDS: int = 60
+    HEALTH_PROBE_TIMEOUT_SECONDS: int = 10
 
 # Security settings - MUST match Auth Service
     SECRET_KEY: str = "your-secret-key-here"  # Load from environment variable
     ALGORITHM: str = "HS256"              # Load from environment variable
     AUTH_SERVICE_URL: str = "http://auth_service:8800" # Load from environment variable
+
+    # Token verification cache (giảm số lần gọi /auth/validate-token)
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    TOKEN_CACHE_MAX_AGE_SECONDS: int = 60
+    # Không có listener thu hồi (chưa cấu hình Redis): token bị auth_service thu hồi vẫn được chấp nhận
+    # tới khi entry hết hạn, nên tuổi tối đa của cache bị giới hạn ở mức ngắn này
+    TOKEN_CACHE_MAX_AGE_WITHOUT_LISTENER_SECONDS: int = 5
+    # Redis dùng chung (response cache; nhận sự kiện thu hồi nếu không có REVOCATION_REDIS_URL)
+    REDIS_URL: str = ""
+    # Redis thu hồi token của auth_service (nơi publish sự kiện thu hồi)
+    REVOCATION_REDIS_URL: str = ""
+    REVOCATION_CHANNEL: str = "auth:revocations"
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8' # Thêm encoding để hỗ trợ ký tự đặc biệt nếu cần
@@ -2,11 +2,13 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+import hashlib
 import httpx
 from httpx import RequestError, HTTPStatusError
 import logging # Thêm logging
 
 from app.core.config import get_settings
+from app.core.token_cache import token_cache
 
 settings = get_settings()
 logger = logging.getLogger(__name__) # Khởi tạo logger
@@ -26,7 +28,7 @@ async def verify_token(token: str = Depends(oauth2_scheme)):
     """
     Xác thực token JWT bằng cách:
     1. Giải mã cơ bản với SECRET_KEY và ALGORITHM.
-    2. Gọi đến endpoint /auth/validate-token của auth_service.
+    2. Dùng kết quả trong token_cache, hoặc gọi đến endpoint /auth/validate-token của auth_service.
 
     Args:
         token: Token JWT từ header Authorization.
@@ -44,10 +46,6 @@ async def verify_token(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    service_unavailable_exception = HTTPException(
-        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-        detail="Authentication service is unavailable",
-    )
 
     # --- Bước 1: Decode cơ bản để kiểm tra format và hạn sử dụng ---
     try:
@@ -67,7 +65,33 @@ async def verify_token(token: str = Depends(oauth2_scheme)):
         logger.warning(f"JWT decode error: {e}")
         raise credentials_exception
 
-    # --- Bước 2: Gọi đến auth_service để xác thực toàn diện ---
+    # --- Bước 2: Dùng kết quả đã cache hoặc gọi auth_service (gộp các lời gọi trùng nhau) ---
+    digest = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    jti = payload.get("jti") or digest # Cùng quy ước định danh với auth_service
+    if token_cache.is_revoked(jti):
+        logger.warning("Token validation failed: token revoked (cached revocation event).")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await token_cache.get_or_validate(
+        digest, jti, payload.get("exp"), lambda: _validate_with_auth_service(token)
+    )
+
+
+async def _validate_with_auth_service(token: str) -> dict:
+    """Gọi endpoint /auth/validate-token của auth_service để xác thực toàn diện."""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    service_unavailable_exception = HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service is unavailable",
+    )
+
     try:
         # Endpoint trong auth_service là /auth/validate-token
         # Nó cũng dùng Depends(oauth2_scheme) nên ta cần gửi token trong header
@@ -92,6 +116,8 @@ async def verify_token(token: str = Depends(oauth2_scheme)):
              logger.warning("Token validation failed: Auth service returned valid=false.")
              raise credentials_exception
 
+    except HTTPException:
+        raise
     except RequestError as e:
         # Lỗi kết nối đến auth_service (network error, DNS lookup failed, etc.)
         logger.error(f"Connection error to auth service at {settings.AUTH_SERVICE_URL}: {e}")
@@ -0,0 +1,210 @@
+# backend/ai_service/app/core/token_cache.py
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import get_settings
+
+try:
+    from redis import asyncio as aioredis
+except ImportError: # Redis là tùy chọn, không có thì chỉ dùng cache cục bộ
+    aioredis = None
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("user_info", "expires_at", "jti")
+
+    def __init__(self, user_info: dict, expires_at: float, jti: str):
+        self.user_info = user_info
+        self.expires_at = expires_at
+        self.jti = jti
+
+
+class TokenVerificationCache:
+    """
+    Cache TTL + LRU cho kết quả xác thực token từ auth_service.
+
+    - Key là digest SHA-256 của token, không lưu token gốc.
+    - Mỗi entry sống tối đa min(exp của token, max_age_seconds).
+    - Sự kiện thu hồi (jti) từ auth_service xóa entry tương ứng ngay lập tức.
+    - Nhiều request đồng thời với cùng token chỉ gọi auth_service một lần.
+    """
+
+    def __init__(self, max_size: int, max_age_seconds: int):
+        self.max_size = max_size
+        self.max_age_seconds = max_age_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_jti: dict[str, set[str]] = {}
+        # jti đã bị thu hồi -> exp, để không cache kết quả của lần xác thực đang chạy dở
+        self._revoked: dict[str, float] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def is_revoked(self, jti: str) -> bool:
+        exp = self._revoked.get(jti)
+        if exp is None:
+            return False
+        if exp <= time.time():
+            del self._revoked[jti]
+            return False
+        return True
+
+    def get(self, digest: str) -> Optional[dict]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self._remove(digest)
+            return None
+        self._entries.move_to_end(digest)
+        return entry.user_info
+
+    def set(self, digest: str, user_info: dict, jti: str, token_exp: Optional[float]) -> None:
+        if self.max_size <= 0 or self.is_revoked(jti):
+            return
+        expires_at = time.time() + self.max_age_seconds
+        if token_exp:
+            expires_at = min(expires_at, token_exp)
+        if expires_at <= time.time():
+            return
+        if digest in self._entries:
+            self._remove(digest)
+        self._entries[digest] = _Entry(user_info, expires_at, jti)
+        self._by_jti.setdefault(jti, set()).add(digest)
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def invalidate_jti(self, jti: str, exp: Optional[float] = None) -> None:
+        self._revoked[jti] = exp or time.time() + self.max_age_seconds
+        if len(self._revoked) > self.max_size:
+            now = time.time()
+            self._revoked = {k: v for k, v in self._revoked.items() if v > now}
+        for digest in self._by_jti.pop(jti, set()):
+            self._entries.pop(digest, None)
+
+    def _remove(self, digest: str) -> None:
+        entry = self._entries.pop(digest, None)
+        if entry is None:
+            return
+        digests = self._by_jti.get(entry.jti)
+        if digests is not None:
+            digests.discard(digest)
+            if not digests:
+                del self._by_jti[entry.jti]
+
+    async def get_or_validate(
+        self,
+        digest: str,
+        jti: str,
+        token_exp: Optional[float],
+        validator: Callable[[], Awaitable[dict]],
+    ) -> dict:
+        cached = self.get(digest)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        task = self._inflight.get(digest)
+        if task is None:
+            task = asyncio.create_task(validator())
+            self._inflight[digest] = task
+
+            def _done(t: asyncio.Task):
+                self._inflight.pop(digest, None)
+                if not t.cancelled() and t.exception() is None:
+                    self.set(digest, t.result(), jti, token_exp)
+
+            task.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+        # shield: một request bị hủy không làm hủy lần xác thực mà các request khác đang chờ
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+# Tuổi tối đa đầy đủ chỉ áp dụng khi listener thu hồi đang chạy (xem start_revocation_listener)
+token_cache = TokenVerificationCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    max_age_seconds=min(settings.TOKEN_CACHE_MAX_AGE_SECONDS, settings.TOKEN_CACHE_MAX_AGE_WITHOUT_LISTENER_SECONDS),
+)
+
+_listener_task: Optional[asyncio.Task] = None
+
+
+async def _listen_revocations(redis_url: str, channel: str):
+    """Nhận sự kiện thu hồi token mà auth_service publish qua Redis pub/sub."""
+    client = aioredis.from_url(redis_url, decode_responses=True)
+    try:
+        while True:
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        event = json.loads(message["data"])
+                        token_cache.invalidate_jti(event["jti"], event.get("exp"))
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"Ignoring malformed revocation event: {message['data']}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Revocation listener error, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    finally:
+        await client.aclose()
+
+
+async def start_revocation_listener():
+    global _listener_task
+    redis_url = settings.REVOCATION_REDIS_URL or settings.REDIS_URL
+    if not redis_url:
+        logger.warning(
+            "REVOCATION_REDIS_URL/REDIS_URL not set; revoked tokens stay accepted for up to "
+            f"{token_cache.max_age_seconds}s (TOKEN_CACHE_MAX_AGE_WITHOUT_LISTENER_SECONDS)."
+        )
+        return
+    if aioredis is None:
+        logger.warning("redis package not installed; revocation events will not invalidate the token cache.")
+        return
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(_listen_revocations(redis_url, settings.REVOCATION_CHANNEL))
+        token_cache.max_age_seconds = settings.TOKEN_CACHE_MAX_AGE_SECONDS
+
+
+async def stop_revocation_listener():
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+        token_cache.max_age_seconds = min(
+            settings.TOKEN_CACHE_MAX_AGE_SECONDS, settings.TOKEN_CACHE_MAX_AGE_WITHOUT_LISTENER_SECONDS
+        )
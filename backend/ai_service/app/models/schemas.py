@@ -29,4 +29,23 @@ class HealthResponse(BaseModel):
     status: str
     uptime: str
     gemini_api: bool
-    system_stats: dict
\ No newline at end of file
+    gemini_checked_at: Optional[float] = None  # Epoch of the last background Gemini probe
+    system_stats: dict
+    gemini_calls: dict = {}  # Queue depth / in-flight metrics of the Gemini call limiter
+    gemini_clients: dict = {}  # Hit/miss counters of the per-key client registry
+    response_cache: dict = {}  # Hit-rate metrics of the chat/vision response cache
+    gemini_flights: dict = {}  # Single-flight counters for identical concurrent requests
+
+
+class LivenessResponse(BaseModel):
+    """Response model for the liveness probe."""
+    status: str
+
+
+class ReadinessResponse(BaseModel):
+    """Response model for the readiness probe."""
+    status: str
+    gemini_api: bool
+    gemini_error: Optional[str] = None
+    gemini_latency_ms: Optional[int] = None
+    checked_at: Optional[float] = None
\ No newline at end of file
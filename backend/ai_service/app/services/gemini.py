@@ -1,14 +1,119 @@
-import google.generativeai as genai
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import google.api_core.exceptions
 from google.generativeai.types import generation_types
 from typing import AsyncGenerator, Tuple
 from app.core.config import get_settings
 from app.models.schemas import ChatMessage
+from app.services.gemini_clients import gemini_clients
 from fastapi import HTTPException, status
 
 settings = get_settings()
 
 
+class GeminiCallLimiter:
+    """
+    Per-worker limiter for upstream Gemini calls.
+    Uses the SDK's native async methods when available, otherwise runs the
+    blocking method on a bounded thread pool so the event loop is never blocked.
+    """
+
+    def __init__(self, max_concurrency: int, thread_pool_size: int, use_async_sdk: bool = True):
+        self.max_concurrency = max_concurrency
+        self.use_async_sdk = use_async_sdk
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=thread_pool_size, thread_name_prefix="gemini")
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot for the duration of an upstream call (or stream)."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+            self.completed += 1
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def run_sync(self, func, *args, **kwargs):
+        """Run a blocking SDK call on the limiter's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def call(self, async_method, sync_method, *args, **kwargs):
+        async with self.slot():
+            if self.use_async_sdk and async_method is not None:
+                return await async_method(*args, **kwargs)
+            return await self.run_sync(sync_method, *args, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+gemini_limiter = GeminiCallLimiter(
+    max_concurrency=settings.GEMINI_MAX_CONCURRENT_CALLS,
+    thread_pool_size=settings.GEMINI_THREAD_POOL_SIZE,
+    use_async_sdk=settings.GEMINI_USE_ASYNC_SDK,
+)
+
+
+def _chunk_text(chunk) -> str:
+    """Return the text of a streamed chunk, raising if the prompt was blocked."""
+    if not chunk.parts:
+        if chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+            raise generation_types.BlockedPromptException(f"Prompt blocked due to {chunk.prompt_feedback.block_reason.name}")
+        return ""
+    return chunk.text
+
+
+def _chat_http_exception(e: Exception) -> HTTPException:
+    """Map an exception raised during chat generation to an HTTPException."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, generation_types.BlockedPromptException):
+        # Safety filter block
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Chat content blocked by Gemini safety filters: {e}")
+    if isinstance(e, google.api_core.exceptions.PermissionDenied):
+        # Map PermissionDenied (403)
+        return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Gemini Permission Denied: {e}")
+    if isinstance(e, google.api_core.exceptions.ResourceExhausted):
+        # Map ResourceExhausted (429)
+        return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=f"Gemini Quota/Rate Limit Exceeded: {e}")
+    if isinstance(e, google.api_core.exceptions.InvalidArgument):
+        # Map InvalidArgument (400)
+        if "api key not valid" in str(e).lower():
+            return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid Gemini API Key: {e}")
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid Argument to Gemini: {e}")
+    if isinstance(e, google.api_core.exceptions.Unauthenticated):
+        # Map Unauthenticated (401)
+        return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Gemini Authentication Failed: {e}")
+    # Catch-all for other unexpected errors
+    return HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error generating chat response with Gemini: {e}")
+
+
 class GeminiService:
     def __init__(self, api_key: str | None = None, model: str | None = None):
         self.genai_model = None
@@ -20,28 +125,19 @@ class GeminiService:
         if not self.api_key:
             raise ValueError("Google Gemini API key is not set")
 
-        genai.configure(api_key=self.api_key)
         try:
-            self.genai_model = genai.GenerativeModel(self.model_id)
+            # Lấy model từ registry theo API key, không đụng tới genai.configure() toàn cục
+            self.genai_model = gemini_clients.get_model(self.api_key, self.model_id)
         except Exception as e:
             raise ValueError(f"Failed to initialize Gemini model '{self.model_id}': {e}")
 
-    async def generate_text_response(
-        self,
-        message: str,
-        history: list[ChatMessage],
-        model: str | None = None
-    ) -> tuple[str, str]:
-        """
-        Generate a text response using Gemini.
-        Returns a tuple of (response_text, model_used).
-        """
-        # Determine which model to use
+    def _resolve_chat_model(self, model: str | None = None):
+        """Return (GenerativeModel, model_id) for a chat request."""
         target_model_id = model or self.model_id
         try:
             if target_model_id != self.model_id:
-                # Initialize a new model instance if a different model is requested
-                model_to_use = genai.GenerativeModel(target_model_id)
+                # Get (or create once) the model handle for the requested model
+                model_to_use = gemini_clients.get_model(self.api_key, target_model_id)
             else:
                 # Use the already initialized model
                 model_to_use = self.genai_model
@@ -56,19 +152,36 @@ class GeminiService:
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f"Gemini chat model '{target_model_id}' could not be used."
             )
+        return model_to_use, target_model_id
 
+    @staticmethod
+    def _format_history(history: list[ChatMessage]) -> list[dict]:
         # Format history for the Gemini API
         # The API expects a list of dicts with 'role' and 'parts' (where parts is a list of strings)
         # Convert history: map 'assistant' role to 'model' for Google API
-        formatted_history = [
+        return [
             {"role": "model" if msg.role == "assistant" else msg.role, "parts": [msg.content]}
             for msg in history
         ]
 
+    async def generate_text_response(
+        self,
+        message: str,
+        history: list[ChatMessage],
+        model: str | None = None
+    ) -> tuple[str, str]:
+        """
+        Generate a text response using Gemini.
+        Returns a tuple of (response_text, model_used).
+        """
+        model_to_use, target_model_id = self._resolve_chat_model(model)
+
         try:
             # Start a chat session with the provided history
-            chat = model_to_use.start_chat(history=formatted_history)
-            response = chat.send_message(message)
+            chat = model_to_use.start_chat(history=self._format_history(history))
+            response = await gemini_limiter.call(
+                getattr(chat, "send_message_async", None), chat.send_message, message
+            )
 
             # Check for empty/blocked response
             if not response.parts:
@@ -80,27 +193,43 @@ class GeminiService:
             # Return both the text and the actual model ID used
             return response.text, target_model_id
 
-        except generation_types.BlockedPromptException as e:
-            # Safety filter block
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Chat content blocked by Gemini safety filters: {e}")
-        except google.api_core.exceptions.PermissionDenied as e:
-            # Map PermissionDenied (403)
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Gemini Permission Denied: {e}")
-        except google.api_core.exceptions.ResourceExhausted as e:
-            # Map ResourceExhausted (429)
-            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=f"Gemini Quota/Rate Limit Exceeded: {e}")
-        except google.api_core.exceptions.InvalidArgument as e:
-            # Map InvalidArgument (400)
-            if "api key not valid" in str(e).lower():
-                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid Gemini API Key: {e}")
-            else:
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid Argument to Gemini: {e}")
-        except google.api_core.exceptions.Unauthenticated as e:
-            # Map Unauthenticated (401)
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Gemini Authentication Failed: {e}")
         except Exception as e:
-            # Catch-all for other unexpected errors
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error generating chat response with Gemini: {e}")
+            raise _chat_http_exception(e)
+
+    async def stream_text_response(
+        self,
+        message: str,
+        history: list[ChatMessage],
+        model: str | None = None
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream a text response from Gemini chunk by chunk (stream=True).
+        Errors are mapped to the same HTTPExceptions as generate_text_response.
+        """
+        model_to_use, _ = self._resolve_chat_model(model)
+
+        async with gemini_limiter.slot():
+            try:
+                chat = model_to_use.start_chat(history=self._format_history(history))
+                if gemini_limiter.use_async_sdk and hasattr(chat, "send_message_async"):
+                    response = await chat.send_message_async(message, stream=True)
+                    async for chunk in response:
+                        text = _chunk_text(chunk)
+                        if text:
+                            yield text
+                else:
+                    # Fallback: iterate the blocking stream on the thread pool
+                    response = await gemini_limiter.run_sync(chat.send_message, message, stream=True)
+                    iterator = iter(response)
+                    while True:
+                        chunk = await gemini_limiter.run_sync(next, iterator, None)
+                        if chunk is None:
+                            break
+                        text = _chunk_text(chunk)
+                        if text:
+                            yield text
+            except Exception as e:
+                raise _chat_http_exception(e)
 
     async def extract_text_from_image(
         self,
@@ -120,11 +249,14 @@ class GeminiService:
         target_model_id = model or settings.GEMINI_VISION_MODEL_NAME
         
         try:
-            # Initialize the vision model
-            vision_model = genai.GenerativeModel(target_model_id)
+            # Get the vision model handle for this API key
+            vision_model = gemini_clients.get_model(self.api_key, target_model_id)
             
             # Send the image to Gemini
-            response = vision_model.generate_content([used_prompt, {"mime_type": "image/jpeg", "data": image_content}])
+            contents = [used_prompt, {"mime_type": "image/jpeg", "data": image_content}]
+            response = await gemini_limiter.call(
+                getattr(vision_model, "generate_content_async", None), vision_model.generate_content, contents
+            )
             
             # Check for empty/blocked response
             if not response.parts:
@@ -0,0 +1,105 @@
+import hashlib
+from collections import OrderedDict
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+from google.api_core import gapic_v1
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+class _KeyClients:
+    """SDK clients and model handles bound to one API key."""
+
+    __slots__ = ("api_key", "sync_client", "async_client", "models")
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.sync_client = None
+        self.async_client = None
+        self.models: "OrderedDict[str, genai.GenerativeModel]" = OrderedDict()
+
+
+class GeminiClientRegistry:
+    """
+    Bounded LRU registry of per-API-key Gemini clients and GenerativeModel handles.
+
+    Each API key gets its own GenerativeService clients built with
+    client_options={"api_key": ...}, so concurrent users with different
+    X-Google-API-Key headers never race on the process-global genai.configure().
+    """
+
+    def __init__(self, max_keys: int, max_models_per_key: int):
+        self.max_keys = max_keys
+        self.max_models_per_key = max_models_per_key
+        self._keys: "OrderedDict[str, _KeyClients]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _digest(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    def _key_clients(self, api_key: str) -> _KeyClients:
+        digest = self._digest(api_key)
+        entry = self._keys.get(digest)
+        if entry is None:
+            entry = _KeyClients(api_key)
+            self._keys[digest] = entry
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+                self.evictions += 1
+        else:
+            self._keys.move_to_end(digest)
+        return entry
+
+    def _client_kwargs(self, api_key: str) -> dict:
+        return {
+            "client_options": {"api_key": api_key},
+            "client_info": gapic_v1.client_info.ClientInfo(user_agent="rumai-ai-service"),
+        }
+
+    def get_model(self, api_key: str, model_id: str) -> genai.GenerativeModel:
+        """
+        Return a cached GenerativeModel for (api_key, model_id), creating it on first use.
+        Called from request handlers on the event loop, so no locking is needed.
+        """
+        entry = self._key_clients(api_key)
+        model = entry.models.get(model_id)
+        if model is not None:
+            entry.models.move_to_end(model_id)
+            self.hits += 1
+            return model
+        self.misses += 1
+
+        if entry.sync_client is None:
+            entry.sync_client = glm.GenerativeServiceClient(**self._client_kwargs(api_key))
+            entry.async_client = glm.GenerativeServiceAsyncClient(**self._client_kwargs(api_key))
+        model = genai.GenerativeModel(model_id)
+        # GenerativeModel has no public hook for per-instance clients; setting these
+        # attributes keeps it from falling back to the global default clients.
+        model._client = entry.sync_client
+        model._async_client = entry.async_client
+        entry.models[model_id] = model
+        while len(entry.models) > self.max_models_per_key:
+            entry.models.popitem(last=False)
+            self.evictions += 1
+        return model
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._keys),
+            "models": sum(len(entry.models) for entry in self._keys.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+gemini_clients = GeminiClientRegistry(
+    max_keys=settings.GEMINI_CLIENT_CACHE_MAX_KEYS,
+    max_models_per_key=settings.GEMINI_MODEL_CACHE_MAX_PER_KEY,
+)
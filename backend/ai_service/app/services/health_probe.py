@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import google.ai.generativelanguage as glm
+import psutil
+
+from app.core.config import get_settings
+from app.services.gemini import gemini_limiter
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class HealthProbe:
+    """
+    Background prober for /health.
+
+    Gemini reachability (list_models) and system stats are refreshed every
+    `interval_seconds` by one task per worker; health endpoints only read the
+    last snapshot, so probes from Docker/load balancers never hit Gemini.
+    """
+
+    def __init__(self, api_key: str, interval_seconds: int, timeout_seconds: int):
+        self.api_key = api_key
+        self.interval_seconds = interval_seconds
+        self.timeout_seconds = timeout_seconds
+        self.gemini_api = False
+        self.gemini_error: Optional[str] = None
+        self.gemini_latency_ms: Optional[int] = None
+        self.checked_at: Optional[float] = None
+        self.system_stats: dict = {}
+        self._model_client = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _list_gemini_models(self) -> bool:
+        # Client riêng cho key cấu hình, không dùng genai.configure() toàn cục
+        if self._model_client is None:
+            self._model_client = glm.ModelServiceClient(client_options={"api_key": self.api_key})
+        models = self._model_client.list_models(
+            glm.ListModelsRequest(page_size=50), timeout=self.timeout_seconds
+        )
+        for model in models:
+            if "gemini" in model.name.lower():
+                return True
+        return False
+
+    @staticmethod
+    def _collect_system_stats() -> dict:
+        return {
+            # interval=None: so sánh với lần gọi trước, không sleep
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "disk_usage": psutil.disk_usage('/').percent
+        }
+
+    async def refresh(self) -> None:
+        self.system_stats = self._collect_system_stats()
+        if not self.api_key:
+            self.gemini_api = False
+            self.gemini_error = "GOOGLE_AI_STUDIO_API_KEY is not configured"
+            self.checked_at = time.time()
+            return
+
+        started = time.monotonic()
+        try:
+            self.gemini_api = await asyncio.wait_for(
+                gemini_limiter.run_sync(self._list_gemini_models),
+                timeout=self.timeout_seconds + 1
+            )
+            self.gemini_error = None if self.gemini_api else "No Gemini models available for the configured key"
+        except Exception as e:
+            self.gemini_api = False
+            self.gemini_error = str(e) or type(e).__name__
+            logger.warning(f"Gemini health probe failed: {self.gemini_error}")
+        self.gemini_latency_ms = int((time.monotonic() - started) * 1000)
+        self.checked_at = time.time()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Health probe error: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_fresh(self) -> bool:
+        # Snapshot quá cũ (task chết hoặc probe bị treo) thì không còn đáng tin
+        return self.checked_at is not None and time.time() - self.checked_at <= self.interval_seconds * 3
+
+    def snapshot(self) -> dict:
+        return {
+            "gemini_api": self.gemini_api,
+            "gemini_error": self.gemini_error,
+            "gemini_latency_ms": self.gemini_latency_ms,
+            "checked_at": self.checked_at,
+            "system_stats": self.system_stats,
+        }
+
+
+health_probe = HealthProbe(
+    api_key=settings.GOOGLE_AI_STUDIO_API_KEY,
+    interval_seconds=settings.HEALTH_PROBE_INTERVAL_SECONDS,
+    timeout_seconds=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import get_settings
+from app.models.schemas import ChatMessage
+
+try:
+    from redis import asyncio as aioredis
+except ImportError: # Redis là tùy chọn, không có thì chỉ dùng tầng in-memory
+    aioredis = None
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Exact-match cache for Gemini chat/vision results.
+
+    - L1: in-process TTL + LRU dict.
+    - L2 (optional): Redis, shared between workers/replicas, same TTL.
+    Keys are SHA-256 digests of the normalized request, never the raw prompt.
+    """
+
+    def __init__(self, enabled: bool, max_entries: int, ttl_seconds: int, redis_url: str = "", key_prefix: str = "ai:resp:"):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._redis = None
+        if enabled and redis_url and aioredis is not None:
+            self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def _digest(kind: str, payload: dict) -> str:
+        raw = json.dumps({"kind": kind, **payload}, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def chat_key(cls, model: str, history: list[ChatMessage], message: str) -> str:
+        # 'assistant' và 'model' là cùng một vai trò đối với Gemini
+        normalized_history = [
+            ["model" if msg.role.lower() in ("assistant", "model") else msg.role.lower(), msg.content.strip()]
+            for msg in history
+        ]
+        return cls._digest("chat", {"model": model, "history": normalized_history, "message": message.strip()})
+
+    @classmethod
+    def vision_key(cls, model: str, prompt: str, image_content: bytes) -> str:
+        image_hash = hashlib.sha256(image_content).hexdigest()
+        return cls._digest("vision", {"model": model, "prompt": prompt.strip(), "image": image_hash})
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.l1_hits += 1
+                return value
+            del self._entries[key]
+
+        if self._redis is not None:
+            try:
+                cached = await self._redis.get(self.key_prefix + key)
+                if cached:
+                    value = json.loads(cached)
+                    self._set_local(key, value)
+                    self.l2_hits += 1
+                    return value
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Response cache Redis read failed: {e}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict) -> None:
+        if not self.enabled:
+            return
+        self._set_local(key, value)
+        if self._redis is not None:
+            try:
+                await self._redis.setex(self.key_prefix + key, self.ttl_seconds, json.dumps(value, ensure_ascii=False))
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Response cache Redis write failed: {e}")
+
+    def _set_local(self, key: str, value: dict) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.time() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.l1_hits + self.l2_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "redis": self._redis is not None,
+            "size": len(self._entries),
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round((self.l1_hits + self.l2_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+
+def cache_bypassed(cache_control: Optional[str]) -> bool:
+    """Per-request opt-out: `Cache-Control: no-cache` or `no-store`."""
+    if not cache_control:
+        return False
+    directives = {d.strip().lower() for d in cache_control.split(",")}
+    return "no-cache" in directives or "no-store" in directives
+
+
+response_cache = ResponseCache(
+    enabled=settings.RESPONSE_CACHE_ENABLED,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    redis_url=settings.REDIS_URL if settings.RESPONSE_CACHE_USE_REDIS else "",
+)
@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent upstream calls.
+
+    The first caller for a key starts the call; callers arriving while it is
+    running await the same task and get the same result or exception.
+    A waiter that is cancelled only detaches itself; the shared call is
+    cancelled when its last waiter goes away.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def key(cache_key: str, api_key: str) -> str:
+        # Tách theo API key: lỗi của một key không hợp lệ không được lan sang request dùng key khác
+        return cache_key + ":" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+    async def do(self, key: str, producer: Callable[[], Awaitable]):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.create_task(producer()))
+            self._flights[key] = flight
+            self.leaders += 1
+
+            def _done(t: asyncio.Task):
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if not t.cancelled():
+                    t.exception() # Đánh dấu đã lấy exception, tránh log "never retrieved"
+
+            flight.task.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Gỡ khỏi bảng ngay để request mới không gắn vào task đang bị hủy
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+                self.cancelled += 1
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+        }
+
+
+gemini_flights = SingleFlight()
@@ -6,6 +6,10 @@ import time
 from app.api.api import api_router
 from app.core.config import get_settings
 from app.core.security import close_http_client # Import hàm đóng client
+from app.core.token_cache import start_revocation_listener, stop_revocation_listener
+from app.services.gemini import gemini_limiter
+from app.services.response_cache import response_cache
+from app.services.health_probe import health_probe
 
 settings = get_settings()
 
@@ -15,9 +19,15 @@ async def lifespan(app: FastAPI):
     # Logic to run on startup (if any)
     # E.g., initialize database connections, load models, etc.
     print("AI Service starting up...")
+    await start_revocation_listener()
+    await health_probe.start()
     yield
     # Logic to run on shutdown
     print("AI Service shutting down...")
+    await stop_revocation_listener()
+    await health_probe.stop()
+    gemini_limiter.shutdown()
+    await response_cache.close()
     await close_http_client()
     print("HTTP client closed.")
 
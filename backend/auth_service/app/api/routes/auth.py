@@ -8,17 +8,19 @@ from pydantic import BaseModel
 from sqlalchemy.exc import SQLAlchemyError
 
 # Cập nhật đường dẫn import
-from app.services.auth_service import register_user, authenticate_user
+from app.services.auth_service import register_user, authenticate_user, get_user_by_email
 from app.utils.security import ( # Tạm thời giữ ở utils, sẽ di chuyển sau
     create_access_token,
     SECRET_KEY, ALGORITHM,
-    hash_password, verify_password
+    ahash_password, averify_password
 )
-from app.utils.cache import cache_response, invalidate_cache # Tạm thời giữ ở utils, sẽ di chuyển sau
-from app.core.database import SessionLocal, get_db, Base # Thêm Base nếu cần tạo bảng trực tiếp từ đây
+from app.utils.cache import cache_response, invalidate_tags # Tạm thời giữ ở utils, sẽ di chuyển sau
+from app.utils.revocation import revocation_store, token_identifier
+from app.core.database import AsyncSessionLocal, get_async_db
 from app.models.user import User
-from app.models.schemas import HealthCheck # Import các schema cần thiết (nếu có) từ app.models.schemas
-from sqlalchemy.orm import Session
+from app.models.schemas import CachedUser, HealthCheck # Import các schema cần thiết (nếu có) từ app.models.schemas
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 import logging
@@ -29,23 +31,16 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")  # Điều chỉnh tokenUrl nếu đường dẫn API thay đổi
 
-# Global in‑memory storage for token blacklisting (logout and token revocation)
-blacklisted_tokens = set()
-
-
 # Dependency to get the current authenticated user
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CachedUser:
     """
     Dependency to retrieve the current authenticated user.
 
+    Returns a cached read-only snapshot (CachedUser); handlers that write reload the ORM object by id.
+
     Raises:
-        HTTPException: If the token is blacklisted, invalid, or user is not found.
+        HTTPException: If the token is revoked, invalid, or user is not found.
     """
-    if token in blacklisted_tokens:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has been revoked"
-        )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -59,12 +54,15 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
         )
-    # Sử dụng Session từ database.py đã cập nhật
-    db: Session = SessionLocal()
-    try: # Thêm try...finally để đảm bảo session được đóng
-        user = db.query(User).filter(User.email == email).first()
-    finally:
-        db.close()
+    if await revocation_store.is_revoked(token_identifier(token, payload)):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    # Tra user qua response_cache: hit ở L1 không cần network. Session chỉ lấy connection
+    # từ pool khi thực sự truy vấn (cache miss) và đóng ngay sau đó
+    async with AsyncSessionLocal() as db:
+        user = await get_user_by_email(email, db)
 
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -146,7 +144,7 @@ class ChangePasswordRequest(BaseModel):
              summary="User registration",
              response_model=RegisterResponse,
              status_code=status.HTTP_201_CREATED)
-async def register(user: UserRegister, db: Session = Depends(get_db)): # Inject db session
+async def register(user: UserRegister, db: AsyncSession = Depends(get_async_db)): # Inject db session
     """
     Register a new user with the following information:
     - username: the user's username (optional)
@@ -162,7 +160,7 @@ async def register(user: UserRegister, db: Session = Depends(get_db)): # Inject
         HTTPException: If registration fails due to existing email or username.
     """
     # Truyền db session vào hàm register_user
-    created_user = register_user(db, user)
+    created_user = await register_user(db, user)
     if not created_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -177,7 +175,7 @@ async def register(user: UserRegister, db: Session = Depends(get_db)): # Inject
 @router.post("/login",
              summary="User login",
              response_model=TokenResponse)
-async def login(user: UserLogin, request: Request, db: Session = Depends(get_db)): # Inject db session
+async def login(user: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)): # Inject db session
     """
     Authenticate a user and return access and refresh tokens.
 
@@ -193,7 +191,7 @@ async def login(user: UserLogin, request: Request, db: Session = Depends(get_db)
         HTTPException: If the email or password is incorrect.
     """
     # Truyền db session vào hàm authenticate_user
-    tokens = authenticate_user(db, user.email, user.password)
+    tokens = await authenticate_user(db, user.email, user.password)
     if not tokens:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -247,10 +245,23 @@ async def refresh_token(data: RefreshTokenRequest):
         )
 
 
+async def _revoke(token: str) -> None:
+    """Thu hồi token cho đến khi nó hết hạn (chỉ cần chữ ký hợp lệ, không cần còn hạn)."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    await revocation_store.revoke(token_identifier(token, payload), payload.get("exp"))
+
+
 @router.post("/logout", summary="Logout user", status_code=status.HTTP_200_OK)
 async def logout(token: str = Depends(oauth2_scheme)):
     """
-    Logout the user by blacklisting the current authentication token.
+    Logout the user by revoking the current authentication token.
 
     Parameters:
         token: The token extracted from the request.
@@ -258,14 +269,14 @@ async def logout(token: str = Depends(oauth2_scheme)):
     Returns:
         JSON message confirming successful logout.
     """
-    blacklisted_tokens.add(token)
+    await _revoke(token)
     return {"message": "Successfully logged out"}
 
 
 @router.post("/revoke-token", summary="Revoke token", status_code=status.HTTP_200_OK)
 async def revoke_token(token: str = Depends(oauth2_scheme)):
     """
-    Revoke the provided token explicitly by blacklisting it.
+    Revoke the provided token explicitly until it expires.
 
     Parameters:
         token: The token to revoke.
@@ -273,12 +284,12 @@ async def revoke_token(token: str = Depends(oauth2_scheme)):
     Returns:
         JSON message indicating the token has been revoked.
     """
-    blacklisted_tokens.add(token)
+    await _revoke(token)
     return {"message": "Token has been revoked"}
 
 
 @router.post("/verify-email/initiate", summary="Initiate email verification", status_code=status.HTTP_200_OK)
-async def initiate_email_verification(current_user: User = Depends(get_current_user)):
+async def initiate_email_verification(current_user: CachedUser = Depends(get_current_user)):
     """
     Generate a verification token for email confirmation and simulate sending it.
     In production, this token should be emailed to the user.
@@ -301,7 +312,7 @@ async def initiate_email_verification(current_user: User = Depends(get_current_u
 @router.get("/verify-email",
             summary="Verify user email",
             status_code=status.HTTP_200_OK)
-async def verify_email(token: str, db: Session = Depends(get_db)): # Inject db session
+async def verify_email(token: str, db: AsyncSession = Depends(get_async_db)): # Inject db session
     """
     Verify the user's email using the provided token.
 
@@ -329,7 +340,7 @@ async def verify_email(token: str, db: Session = Depends(get_db)): # Inject db s
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -338,9 +349,9 @@ async def verify_email(token: str, db: Session = Depends(get_db)): # Inject db s
 
     user.email_verified = True
     try:
-        db.commit()
+        await db.commit()
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error during email verification: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to verify email")
 
@@ -348,7 +359,7 @@ async def verify_email(token: str, db: Session = Depends(get_db)): # Inject db s
 
 
 @router.post("/forgot-password", summary="Initiate password reset flow", status_code=status.HTTP_200_OK)
-async def forgot_password(request_data: ForgotPasswordRequest, db: Session = Depends(get_db)): # Inject db session
+async def forgot_password(request_data: ForgotPasswordRequest, db: AsyncSession = Depends(get_async_db)): # Inject db session
     """
     Accept an email address and, if a user exists, create a short-lived reset token.
     In production, this token should be emailed to the user.
@@ -360,7 +371,7 @@ async def forgot_password(request_data: ForgotPasswordRequest, db: Session = Dep
     Returns:
         JSON message confirming that if the email exists, a reset link has been sent.
     """
-    user = db.query(User).filter(User.email == request_data.email).first()
+    user = await db.scalar(select(User).where(User.email == request_data.email))
     # Always return the same response to avoid email harvesting
     reset_token = None
     if user:
@@ -376,7 +387,7 @@ async def forgot_password(request_data: ForgotPasswordRequest, db: Session = Dep
 
 
 @router.post("/reset-password", summary="Reset password using token", status_code=status.HTTP_200_OK)
-async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_db)): # Inject db session
+async def reset_password(data: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)): # Inject db session
     """
     Reset the user's password after verifying the provided reset token.
 
@@ -404,15 +415,16 @@ async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_d
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    user.hashed_password = hash_password(data.new_password)
+    user.hashed_password = await ahash_password(data.new_password)
     try:
-        db.commit()
+        await db.commit()
+        await invalidate_tags(f"user:{user.id}", f"user_email:{user.email}")
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error during password reset: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to reset password")
 
@@ -422,8 +434,8 @@ async def reset_password(data: ResetPasswordRequest, db: Session = Depends(get_d
 @router.post("/change-password", summary="Change password for authenticated user", status_code=status.HTTP_200_OK)
 async def change_password(
         data: ChangePasswordRequest,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db) # Inject db session
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db) # Inject db session
 ):
     """
     Change the password for the authenticated user after verifying the old password.
@@ -439,22 +451,22 @@ async def change_password(
     Raises:
         HTTPException: If the old password is incorrect.
     """
-    if not verify_password(data.old_password, current_user.hashed_password):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Old password is incorrect")
-
-    # Lấy user từ DB bằng ID để đảm bảo instance được quản lý bởi session hiện tại
-    user = db.query(User).filter(User.id == current_user.id).first()
+    # Lấy user từ DB bằng ID: current_user là bản cache, không có hashed_password
+    user = await db.get(User, current_user.id)
     # Mặc dù get_current_user đã kiểm tra, kiểm tra lại ở đây là an toàn
     if not user:
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    user.hashed_password = hash_password(data.new_password)
+    if not await averify_password(data.old_password, user.hashed_password):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Old password is incorrect")
+
+    user.hashed_password = await ahash_password(data.new_password)
     try:
-        db.commit()
+        await db.commit()
         # Invalidate cache liên quan nếu có
-        await invalidate_cache(f"get_profile:{user.id}") # Ví dụ cache key
+        await invalidate_tags(f"user:{user.id}", f"user_email:{user.email}")
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error during password change: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to change password")
 
@@ -462,8 +474,13 @@ async def change_password(
 
 
 @router.get("/profile", summary="Retrieve current user profile", response_model=UserResponse)
-@cache_response(expire_time_seconds=300) # Cache profile response
-async def get_profile(current_user: User = Depends(get_current_user)):
+@cache_response( # Cache profile response
+    expire_time_seconds=300,
+    key=lambda current_user, **_: current_user.id,
+    model=UserResponse,
+    tags=lambda current_user, **_: [f"user:{current_user.id}"]
+)
+async def get_profile(current_user: CachedUser = Depends(get_current_user)):
     """
     Retrieve the profile of the currently authenticated user.
 
@@ -481,8 +498,8 @@ async def get_profile(current_user: User = Depends(get_current_user)):
 @router.put("/profile", summary="Update user profile", response_model=UserResponse)
 async def update_profile(
         request: UpdateUserRequest,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update the profile of the currently authenticated user.
@@ -498,7 +515,7 @@ async def update_profile(
     Raises:
         HTTPException: If the user is not found or username is taken.
     """
-    user = db.query(User).filter(User.id == current_user.id).first()
+    user = await db.get(User, current_user.id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -507,10 +524,10 @@ async def update_profile(
     # Kiểm tra nếu username được cập nhật và khác với username hiện tại
     if "username" in update_data and update_data["username"] != user.username:
         # Kiểm tra username mới đã tồn tại chưa (ngoại trừ user hiện tại)
-        existing_user = db.query(User).filter(
+        existing_user = await db.scalar(select(User).where(
             User.username == update_data["username"],
             User.id != current_user.id
-        ).first()
+        ))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -522,13 +539,13 @@ async def update_profile(
         setattr(user, key, value)
 
     try:
-        db.commit()
+        await db.commit()
         # Invalidate cache cho profile đã cập nhật
-        await invalidate_cache(f"get_profile:{user.id}") # Sử dụng cache key phù hợp
-        db.refresh(user)
+        await invalidate_tags(f"user:{user.id}", f"user_email:{user.email}")
+        await db.refresh(user)
         return UserResponse.model_validate(user) # Trả về theo schema
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error updating profile: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update profile")
     except Exception as e: # Bắt các lỗi khác nếu có
@@ -539,8 +556,8 @@ async def update_profile(
 @router.put("/profile/email", summary="Update user email and reset verification", response_model=UserResponse)
 async def update_email(
         update_data: UpdateEmailRequest,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: CachedUser = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update the user's email and reset email verification status. Requires re-verification.
@@ -556,7 +573,7 @@ async def update_email(
     Raises:
         HTTPException: If the user is not found or email is already taken.
     """
-    user = db.query(User).filter(User.id == current_user.id).first()
+    user = await db.get(User, current_user.id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -565,35 +582,40 @@ async def update_email(
         return UserResponse.model_validate(user) # Không có gì thay đổi
 
     # Kiểm tra email mới đã tồn tại chưa
-    existing_email = db.query(User).filter(User.email == new_email).first()
+    existing_email = await db.scalar(select(User).where(User.email == new_email))
     if existing_email:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
 
+    old_email = user.email
     user.email = new_email
     user.email_verified = False # Yêu cầu xác thực lại email mới
     try:
-        db.commit()
-         # Invalidate cache liên quan
-        await invalidate_cache(f"get_profile:{user.id}")
-        await invalidate_cache(f"get_user_by_email:{user.email}") # Cache key cũ
-        db.refresh(user)
+        await db.commit()
+         # Invalidate cache liên quan (cả tra cứu theo email cũ lẫn email mới)
+        await invalidate_tags(f"user:{user.id}", f"user_email:{old_email}", f"user_email:{new_email}")
+        await db.refresh(user)
         # TODO: Có thể gửi lại email xác thực ở đây
         logger.info(f"User {user.id} updated email to {new_email}. Verification reset.")
         return UserResponse.model_validate(user)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error updating email: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update email")
 
 
 @router.delete("/profile", summary="Deactivate user account", status_code=status.HTTP_200_OK)
-async def deactivate_account(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def deactivate_account(
+    current_user: CachedUser = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Deactivate the account of the currently authenticated user.
-    Instead of a hard delete, the user account is set as inactive.
+    Instead of a hard delete, the user account is set as inactive and the current token is revoked.
 
     Parameters:
         current_user: The currently authenticated user.
+        token: The JWT token used for this request.
         db: Database session dependency.
 
     Returns:
@@ -602,7 +624,7 @@ async def deactivate_account(current_user: User = Depends(get_current_user), db:
     Raises:
         HTTPException: If the user is not found.
     """
-    user = db.query(User).filter(User.id == current_user.id).first()
+    user = await db.get(User, current_user.id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -611,27 +633,32 @@ async def deactivate_account(current_user: User = Depends(get_current_user), db:
 
     user.is_active = False
     try:
-        db.commit()
+        await db.commit()
         # Invalidate cache liên quan
-        await invalidate_cache(f"get_profile:{user.id}")
-        # Có thể cân nhắc blacklist token hiện tại của user
-        # blacklisted_tokens.add(token_used_for_this_request)
+        await invalidate_tags(f"user:{user.id}", f"user_email:{user.email}")
+        # Thu hồi token hiện tại để nó không còn qua được is_revoked()
+        await _revoke(token)
         logger.info(f"User account {user.id} deactivated.")
         return {"message": "User account has been deactivated"}
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error deactivating account: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to deactivate account")
 
 
 @router.delete("/profile/permanent", summary="Permanently delete user account", status_code=status.HTTP_200_OK)
-async def delete_account_permanent(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def delete_account_permanent(
+    current_user: CachedUser = Depends(get_current_user),
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Permanently delete the account of the currently authenticated user.
-    This action removes the user from the database entirely. Use with caution.
+    This action removes the user from the database entirely and revokes the current token. Use with caution.
 
     Parameters:
         current_user: The currently authenticated user.
+        token: The JWT token used for this request.
         db: Database session dependency.
 
     Returns:
@@ -640,23 +667,22 @@ async def delete_account_permanent(current_user: User = Depends(get_current_user
     Raises:
         HTTPException: If the user is not found.
     """
-    user = db.query(User).filter(User.id == current_user.id).first()
+    user = await db.get(User, current_user.id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     try:
         # Xóa cache trước khi xóa user
-        await invalidate_cache(f"get_profile:{user.id}")
-        await invalidate_cache(f"get_user_by_id:{user.id}")
-        await invalidate_cache(f"get_user_by_email:{user.email}")
+        await invalidate_tags(f"user:{user.id}", f"user_email:{user.email}")
 
-        db.delete(user)
-        db.commit()
-        # Có thể cân nhắc blacklist token hiện tại của user
+        await db.delete(user)
+        await db.commit()
+        # Thu hồi token hiện tại để nó không còn qua được is_revoked()
+        await _revoke(token)
         logger.info(f"User account {user.id} permanently deleted.")
         return {"message": "User account has been permanently deleted"}
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error permanently deleting account: {str(e)}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete account permanently")
 
@@ -665,7 +691,7 @@ async def delete_account_permanent(current_user: User = Depends(get_current_user
              summary="Validate JWT token",
              response_model=dict, # Trả về dict đơn giản
              status_code=status.HTTP_200_OK)
-async def validate_token(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def validate_token(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """
     Validate the integrity and expiration of a JWT token and check if the user exists.
 
@@ -679,14 +705,6 @@ async def validate_token(token: str = Depends(oauth2_scheme), db: Session = Depe
     Raises:
         HTTPException: If the token is invalid, expired, revoked, or user not found.
     """
-    # Kiểm tra token có trong blacklist không
-    if token in blacklisted_tokens:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has been revoked",
-             headers={"WWW-Authenticate": "Bearer"},
-        )
-
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid token or token has expired",
@@ -705,8 +723,16 @@ async def validate_token(token: str = Depends(oauth2_scheme), db: Session = Depe
     except JWTError:
         raise credentials_exception
 
+    # Kiểm tra token đã bị thu hồi chưa
+    if await revocation_store.is_revoked(token_identifier(token, payload)):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     # Kiểm tra user có tồn tại trong database không
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(User.email == email))
 
     if not user:
         raise HTTPException(
@@ -1,14 +1,44 @@
 # app/core/database.py
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import get_settings
 
-DATABASE_URL = get_settings().DATABASE_URL
+settings = get_settings()
+DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(DATABASE_URL)
+
+def _to_async_url(url: str) -> str:
+    """Chuyển DATABASE_URL (psycopg2) sang driver asyncpg."""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _to_async_url(DATABASE_URL)
+
+# Engine đồng bộ: chỉ dùng cho create_all lúc khởi động và migrations
+engine = create_engine(DATABASE_URL, pool_pre_ping=settings.DB_POOL_PRE_PING)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine bất đồng bộ: dùng cho các request handler để không chặn event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False, # Giữ lại giá trị thuộc tính sau commit, tránh lazy load ngoài async context
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -16,4 +46,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
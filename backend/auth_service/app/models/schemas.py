@@ -1,6 +1,8 @@
 # app/models/schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Literal
+from datetime import datetime
+from uuid import UUID
 
 
 class ServiceHealth(BaseModel):
@@ -16,4 +18,23 @@ class ServicesStatus(BaseModel):
 class HealthCheck(BaseModel):
     status: Literal["healthy", "unhealthy"]
     services: ServicesStatus
-    version: str
\ No newline at end of file
+    version: str
+    cache: dict = {} # Bộ đếm hit/miss/eviction của từng tầng cache_response
+    last_login: dict = {} # Trạng thái buffer ghi last_login theo lô
+
+
+class CachedUser(BaseModel):
+    """Bản chụp chỉ đọc của User để cache (không chứa hashed_password). Cần ghi thì lấy lại ORM object từ DB."""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    username: Optional[str] = None
+    email: str
+    full_name: Optional[str] = None
+    is_active: bool
+    email_verified: Optional[bool] = None
+    last_login: Optional[datetime] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    russian_level: Optional[str] = None
+    gemini_api_key: Optional[str] = None
\ No newline at end of file
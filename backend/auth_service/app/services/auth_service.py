@@ -1,13 +1,16 @@
 # app/services/auth_service.py
 import logging
+from fastapi import HTTPException
+from sqlalchemy import or_, select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 # Cập nhật đường dẫn import
-from app.core.database import SessionLocal
 from app.models.user import User
-from app.utils.cache import cache_response, invalidate_cache # Tạm thời giữ ở utils, sẽ di chuyển sau
-from app.utils.security import hash_password, verify_password, create_access_token, create_refresh_token # Tạm thời giữ ở utils, sẽ di chuyển sau
+from app.models.schemas import CachedUser
+from app.utils.cache import cache_response, invalidate_tags # Tạm thời giữ ở utils, sẽ di chuyển sau
+from app.utils.login_activity import last_login_writer
+from app.utils.security import ahash_password, averify_password, create_access_token, create_refresh_token # Tạm thời giữ ở utils, sẽ di chuyển sau
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session # Import Session
 
 # Thêm cấu hình logging
 logging.basicConfig(
@@ -18,12 +21,12 @@ logger = logging.getLogger(__name__)
 
 
 # Sửa hàm để nhận db session làm tham số thay vì tạo mới
-def register_user(db: Session, user_data):
+async def register_user(db: AsyncSession, user_data):
     """
     Đăng ký người dùng mới.
 
     Args:
-        db: Session SQLAlchemy.
+        db: AsyncSession SQLAlchemy.
         user_data: Dữ liệu người dùng từ request (Pydantic model).
 
     Returns:
@@ -31,11 +34,10 @@ def register_user(db: Session, user_data):
     """
     try:
         # Kiểm tra email hoặc username đã tồn tại
-        # Dùng ORM filter thay vì OR bitwise để rõ ràng hơn
-        existing_user = db.query(User).filter(
-            (User.email == user_data.email) |
-            (User.username == user_data.username if user_data.username else False) # Chỉ kiểm tra username nếu có
-        ).first()
+        conditions = [User.email == user_data.email]
+        if user_data.username: # Chỉ kiểm tra username nếu có
+            conditions.append(User.username == user_data.username)
+        existing_user = await db.scalar(select(User).where(or_(*conditions)).limit(1))
 
         if existing_user:
             detail = "Email already registered."
@@ -48,7 +50,7 @@ def register_user(db: Session, user_data):
             return None # Giữ nguyên logic cũ để router xử lý
 
         # Tạo user mới
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await ahash_password(user_data.password)
         db_user = User(
             username=user_data.username,
             email=user_data.email,
@@ -57,30 +59,36 @@ def register_user(db: Session, user_data):
             hashed_password=hashed_password
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
+        # Xóa kết quả "không tìm thấy" có thể đã được cache cho email này
+        await invalidate_tags(f"user_email:{db_user.email}")
 
         # Không cần trả về dict nữa, router sẽ dùng UserResponse schema
         logger.info(f"Successfully registered new user: {user_data.email}")
         return db_user # Trả về đối tượng User ORM
+    except HTTPException:
+        # Pool băm mật khẩu quá tải (503) -> để router trả về nguyên trạng
+        await db.rollback()
+        raise
     except IntegrityError as e:
         logger.error(f"Database integrity error during registration: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return None
     except Exception as e:
         logger.error(f"Error during user registration: {str(e)}")
-        db.rollback()
+        await db.rollback()
         return None
-    # Không cần finally db.close() vì session được quản lý bởi Depends(get_db)
+    # Không cần finally db.close() vì session được quản lý bởi Depends(get_async_db)
 
 
 # Sửa hàm để nhận db session, email, password làm tham số
-def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """
     Xác thực người dùng.
 
     Args:
-        db: Session SQLAlchemy.
+        db: AsyncSession SQLAlchemy.
         email: Email người dùng.
         password: Mật khẩu người dùng.
 
@@ -89,10 +97,10 @@ def authenticate_user(db: Session, email: str, password: str):
     """
     try:
         # Tìm user theo email
-        user = db.query(User).filter(User.email == email).first()
+        user = await db.scalar(select(User).where(User.email == email))
 
         # Nếu không tìm thấy user, user bị inactive, hoặc mật khẩu không đúng
-        if not user or not user.is_active or not verify_password(password, user.hashed_password):
+        if not user or not user.is_active or not await averify_password(password, user.hashed_password):
             logger.warning(f"Failed login attempt for email: {email}")
             return None
 
@@ -104,46 +112,32 @@ def authenticate_user(db: Session, email: str, password: str):
         access_token = create_access_token(token_data)
         refresh_token = create_refresh_token(token_data)
 
-        # Cập nhật thời gian đăng nhập gần nhất
-        user.last_login = datetime.now(timezone.utc)
-        db.commit() # Commit thay đổi last_login
+        # Cập nhật thời gian đăng nhập gần nhất: ghi vào buffer, task nền ghi DB theo lô
+        last_login_writer.record(user.id, datetime.now(timezone.utc))
 
         logger.info(f"Successful login for user: {email}")
 
         return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during authentication for {email}: {str(e)}")
         return None
     # Không cần finally db.close()
 
 
-@cache_response(expire_time_seconds=300)
-async def get_user_by_email(email: str, db: Session): # Inject db session
-    """Lấy user theo email (cached)."""
+@cache_response(
+    expire_time_seconds=300,
+    key=lambda email, **_: email,
+    model=CachedUser,
+    tags=lambda email, **_: [f"user_email:{email}"]
+)
+async def get_user_by_email(email: str, db: AsyncSession): # Inject db session
+    """Lấy user theo email (cached, trả về CachedUser). Lỗi DB được raise, không cache thành "không tìm thấy"."""
     try:
-        user = db.query(User).filter(User.email == email).first()
-        return user
+        return await db.scalar(select(User).where(User.email == email))
     except Exception as e:
          logger.error(f"Error fetching user by email {email}: {e}")
-         return None
+         raise
     # Session được quản lý bởi dependency
-
-
-@cache_response(expire_time_seconds=300)
-async def get_user_by_id(user_id: str, db: Session): # Inject db session
-    """Lấy user theo ID (cached)."""
-    try:
-        # Chuyển đổi user_id sang UUID nếu cần
-        from uuid import UUID
-        try:
-            user_uuid = UUID(user_id)
-        except ValueError:
-            logger.warning(f"Invalid UUID format for user_id: {user_id}")
-            return None
-        user = db.query(User).filter(User.id == user_uuid).first()
-        return user
-    except Exception as e:
-        logger.error(f"Error fetching user by ID {user_id}: {e}")
-        return None
-    # Session được quản lý bởi dependency
\ No newline at end of file
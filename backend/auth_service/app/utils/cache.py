@@ -1,7 +1,21 @@
 # app/utils/cache.py
+import asyncio
+import fnmatch
+import hashlib
+import inspect
 import json
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, NamedTuple, Optional, Type
 
+import orjson
 from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from redis import asyncio as aioredis
 from functools import wraps
 from datetime import timedelta
@@ -28,102 +42,541 @@ except Exception as e:
     # Có thể raise lỗi ở đây hoặc để các hàm sử dụng redis_client tự xử lý None
 
 
-def cache_response(expire_time_seconds: int = 60):
-    def decorator(func):
-        @wraps(func)
-        async def wrapper(*args, **kwargs):
-            if not redis_client:
-                 logger.warning("Redis client not available, skipping cache.")
-                 return await func(*args, **kwargs)
+class LocalCache:
+    """
+    L1: cache TTL + LRU trong process, giới hạn cả số entry lẫn tổng số byte.
+    Lưu entry đã serialize (bytes), mỗi lần đọc trả về bản sao mới (không chia sẻ object giữa các request).
+    Giữ thêm chỉ mục tag -> key để invalidate theo tag không phải duyệt toàn bộ cache.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self._key_tags: dict[str, tuple[str, ...]] = {}
+        self._tag_keys: dict[str, set[str]] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: int, tags: tuple[str, ...] = ()) -> None:
+        size = len(value)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + min(ttl_seconds, self.ttl_seconds), value)
+        self._bytes += size
+        if tags:
+            self._key_tags[key] = tags
+            for tag in tags:
+                self._tag_keys.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= len(entry[1])
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_keys[tag]
+        return True
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            for key in list(self._tag_keys.get(tag, ())):
+                removed += self._remove(key)
+        return removed
+
+    def invalidate(self, pattern: str) -> int:
+        if not any(ch in pattern for ch in "*?["):
+            return int(self._remove(pattern))
+        keys = [key for key in self._entries if fnmatch.fnmatchcase(key, pattern)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TwoTierCache:
+    """
+    Cache cho cache_response: L1 trong process phía trước Redis (L2).
+
+    - Đọc: L1 -> Redis -> hàm gốc. Key nóng (vd. profile) được trả về từ L1, không có network I/O.
+    - L1 sống tối đa CACHE_L1_TTL_SECONDS để giới hạn độ trễ khi lỡ mất sự kiện invalidation.
+    - Mỗi entry có thể gắn tag (vd. "user:{id}"); key được ghi thêm vào set Redis "tag:{tag}".
+      invalidate_tags() đọc các set đó và UNLINK đúng các key liên quan: chi phí theo số key của tag,
+      không theo kích thước toàn bộ keyspace như SCAN.
+    - invalidate_tags() xóa ở cả hai tầng và publish qua Redis pub/sub để các worker khác xóa L1 của họ.
+    - Không có Redis: chỉ dùng L1.
+    - load(): single-flight theo key khi miss — một task tính giá trị cho cả process,
+      lock Redis (SET NX) để các worker khác chờ kết quả thay vì cùng truy vấn DB.
+    """
+
+    def __init__(
+        self,
+        client: Optional[aioredis.Redis],
+        local: LocalCache,
+        channel: str,
+        lock_timeout_seconds: float,
+        tag_ttl_seconds: int,
+    ):
+        self.client = client
+        self.local = local
+        self.channel = channel
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self.tag_ttl_seconds = tag_ttl_seconds
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.lock_waits = 0
+        self.background_refreshes = 0
+        self._flights: dict[str, asyncio.Task] = {}
+        self._listener_task: Optional[asyncio.Task] = None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = await self._get_l2(key)
+        if value is None:
+            return None
+        entry = decode_entry(value)
+        # Giữ tag của entry để invalidate_tags() xóa được cả bản sao L1 lấy từ Redis
+        self.local.set(key, value, self.local.ttl_seconds, entry.tags if entry else ())
+        return value
+
+    async def _get_l2(self, key: str) -> Optional[bytes]:
+        if not self.client:
+            return None
+        try:
+            value = await self.client.get(key)
+        except aioredis.RedisError as e:
+            self.l2_errors += 1
+            logger.error(f"Redis error while reading cache key {key}: {e}")
+            return None
+        if value is None:
+            self.l2_misses += 1
+            return None
+        self.l2_hits += 1
+        if isinstance(value, str): # redis_client dùng decode_responses=True
+            value = value.encode("utf-8")
+        return value
+
+    async def set(self, key: str, value: bytes, ttl_seconds: int, tags: tuple[str, ...] = ()) -> None:
+        self.local.set(key, value, ttl_seconds, tags)
+        if not self.client:
+            return
+        try:
+            if not tags:
+                await self.client.setex(key, ttl_seconds, value)
+                return
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl_seconds, value)
+                for tag in tags:
+                    # Set tag sống lâu hơn mọi entry; member đã hết hạn chỉ làm UNLINK thừa, vô hại
+                    pipe.sadd(f"tag:{tag}", key)
+                    pipe.expire(f"tag:{tag}", self.tag_ttl_seconds)
+                await pipe.execute()
+        except aioredis.RedisError as e:
+            self.l2_errors += 1
+            logger.error(f"Redis error while writing cache key {key}: {e}")
 
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return
+        self.local.invalidate_tags(tags)
+        if not self.client:
+            return
+        try:
+            # MULTI: đọc và xóa set tag cùng lúc, entry ghi sau đó sẽ vào set mới
+            async with self.client.pipeline(transaction=True) as pipe:
+                for tag in tags:
+                    pipe.smembers(f"tag:{tag}")
+                    pipe.delete(f"tag:{tag}")
+                results = await pipe.execute()
+            keys = set().union(*results[0::2])
+            async with self.client.pipeline(transaction=False) as pipe:
+                if keys:
+                    pipe.unlink(*keys)
+                pipe.publish(self.channel, json.dumps({"tags": tags}))
+                await pipe.execute()
+            logger.debug(f"Invalidated {len(keys)} cache keys for tags {tags}")
+        except aioredis.RedisError as e:
+            self.l2_errors += 1
+            logger.error(f"Redis error during cache invalidation (tags: {tags}): {e}")
+
+    def _apply_remote_invalidation(self, data: str) -> None:
+        message = json.loads(data)
+        if "tags" in message:
+            self.local.invalidate_tags(message["tags"])
+        else:
+            # Sự kiện không rõ dạng (vd. từ phiên bản cũ): bỏ toàn bộ L1 cho an toàn
+            self.local.invalidate("*")
+
+    async def start(self) -> None:
+        if self.client and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
             try:
-                # Tạo cache key (cải thiện cách tạo key)
-                # Nên loại bỏ các đối tượng không thể hash hoặc chuyển đổi thành string ổn định
-                # Ví dụ: Bỏ qua các đối tượng Session SQLAlchemy nếu có trong args/kwargs
-                key_parts = [func.__name__]
-                for arg in args:
-                    # Bỏ qua session hoặc các đối tượng phức tạp khác
-                    if hasattr(arg, '__class__') and 'Session' in str(arg.__class__):
-                        continue
-                    try:
-                        key_parts.append(str(arg))
-                    except Exception: # Bỏ qua nếu không thể chuyển thành string
-                        pass
-                for k, v in kwargs.items():
-                     if hasattr(v, '__class__') and 'Session' in str(v.__class__):
-                        continue
-                     try:
-                        key_parts.append(f"{k}={v}")
-                     except Exception:
-                        pass
-
-                cache_key = ":".join(key_parts)
-                logger.info(f"Attempting to get from cache: {cache_key}")
-
-                # Thử lấy từ cache
-                cached = await redis_client.get(cache_key)
-                if cached:
-                    logger.debug(f"Cache hit for {func.__name__} - key: {cache_key}")
-                    try:
-                         return json.loads(cached)
-                    except json.JSONDecodeError:
-                         logger.warning(f"Failed to decode cached JSON for key {cache_key}. Fetching fresh data.")
-
-
-                # Nếu không có trong cache, gọi hàm gốc
-                logger.debug(f"Cache miss for {func.__name__} - key: {cache_key}")
-                response = await func(*args, **kwargs)
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
 
-                # Chuyển đổi response thành JSON trước khi cache
+    async def _listen(self) -> None:
+        """Nhận sự kiện invalidation (tags) từ các worker/replica khác và xóa L1 tương ứng."""
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_remote_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error, reconnecting: {e}")
+                # Có thể đã lỡ sự kiện khi mất kết nối -> bỏ toàn bộ L1 cho an toàn
+                self.local.invalidate("*")
+                await asyncio.sleep(1)
+            finally:
                 try:
-                    cache_data = jsonable_encoder(response)
-                    json_cache_data = json.dumps(cache_data)
-                except TypeError as e:
-                     logger.error(f"Could not serialize response for caching ({func.__name__}): {e}")
-                     return response # Trả về response gốc nếu không thể serialize
+                    await pubsub.aclose()
+                except Exception:
+                    pass
 
-                # Lưu vào cache
-                await redis_client.setex(
-                    cache_key,
-                    expire_time_seconds,
-                    json_cache_data
-                )
+    # --- Chống cache stampede ---
 
-                logger.debug(f"Cached result for {func.__name__} - key: {cache_key}")
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        """Trả về token nếu giữ được lock, None nếu worker khác đang giữ. Không có Redis: coi như giữ được."""
+        if not self.client:
+            return ""
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self.client.set(f"lock:{key}", token, nx=True, px=int(self.lock_timeout_seconds * 1000))
+        except aioredis.RedisError as e:
+            self.l2_errors += 1
+            logger.error(f"Redis error while locking cache key {key}: {e}")
+            return ""
+        return token if acquired else None
+
+    async def _release_lock(self, key: str, token: str) -> None:
+        if not self.client or not token:
+            return
+        try:
+            # Chỉ xóa lock của chính mình (lock có thể đã hết hạn và bị worker khác lấy)
+            await self.client.eval(
+                "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0",
+                1, f"lock:{key}", token
+            )
+        except aioredis.RedisError as e:
+            logger.error(f"Redis error while unlocking cache key {key}: {e}")
+
+    async def _wait_for_fresh(self, key: str) -> Optional[bytes]:
+        """Chờ worker đang giữ lock ghi giá trị mới, tối đa lock_timeout_seconds."""
+        self.lock_waits += 1
+        deadline = time.monotonic() + self.lock_timeout_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            # Đọc thẳng Redis: L1 của worker này có thể vẫn giữ bản đã hết hạn logic
+            payload = await self._get_l2(key)
+            entry = decode_entry(payload)
+            if entry is not None and entry.expires_at > time.time():
+                self.local.set(key, payload, self.local.ttl_seconds, entry.tags)
+                return payload
+        return None
+
+    async def _load_locked(self, key: str, loader):
+        token = await self._acquire_lock(key)
+        if token is None:
+            payload = await self._wait_for_fresh(key)
+            if payload is not None:
+                return None, payload
+            # Hết thời gian chờ: tự tính để không treo request
+        try:
+            self.loads += 1
+            return await loader()
+        finally:
+            await self._release_lock(key, token)
+
+    async def load(self, key: str, loader):
+        """
+        Chạy loader() một lần cho mỗi key đang miss. loader trả về (response, payload).
+        Trả về (response, payload, leader): chỉ leader (caller tạo task) dùng response gốc, caller khác dùng
+        payload đã serialize (giống cache hit) để không chia sẻ object giữa các request.
+        """
+        task = self._flights.get(key)
+        if task is not None:
+            self.coalesced += 1
+            _, payload = await asyncio.shield(task)
+            return None, payload, False
+        task = asyncio.create_task(self._load_locked(key, loader))
+        self._flights[key] = task
+        task.add_done_callback(lambda _: self._flights.pop(key, None))
+        response, payload = await asyncio.shield(task)
+        return response, payload, True
+
+    def refresh_in_background(self, key: str, loader) -> None:
+        """Làm mới key trong nền (stale-while-revalidate), bỏ qua nếu key đang được tính."""
+        if key in self._flights:
+            return
+        self.background_refreshes += 1
+        task = asyncio.create_task(self._load_locked(key, loader))
+        self._flights[key] = task
+
+        def _done(t: asyncio.Task) -> None:
+            self._flights.pop(key, None)
+            if not t.cancelled() and t.exception() is not None:
+                logger.error(f"Background cache refresh failed for key {key}: {t.exception()}")
+
+        task.add_done_callback(_done)
+
+    def stats(self) -> dict:
+        return {
+            "l1": self.local.stats(),
+            "l2": {
+                "enabled": self.client is not None,
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "errors": self.l2_errors,
+            },
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "lock_waits": self.lock_waits,
+            "background_refreshes": self.background_refreshes,
+        }
 
-                return response
 
-            except aioredis.RedisError as e:
-                 logger.error(f"Redis error during cache operation ({func.__name__}): {str(e)}")
-                 # Fallback to original function if cache fails
-                 return await func(*args, **kwargs)
+class CacheEntry(NamedTuple):
+    expires_at: float # Thời điểm hết hạn logic (epoch)
+    delta: float # Thời gian tính giá trị (giây), dùng cho XFetch
+    tags: tuple[str, ...]
+    value: bytes # JSON của giá trị, chỉ parse khi thực sự trả về
+
+
+def encode_entry(value: bytes, expires_at: float, delta: float, tags: tuple[str, ...]) -> bytes:
+    """
+    Entry trong cache: header JSON [expires_at, delta, tags], "\n", rồi JSON của giá trị.
+    Key trong Redis sống thêm stale_ttl_seconds sau expires_at để phục vụ stale-while-revalidate.
+    """
+    # orjson không bao giờ sinh ký tự xuống dòng thô nên "\n" đầu tiên luôn là dấu phân cách
+    return orjson.dumps([expires_at, delta, tags]) + b"\n" + value
+
+
+def decode_entry(payload: Optional[bytes]) -> Optional[CacheEntry]:
+    if not payload:
+        return None
+    header, sep, value = payload.partition(b"\n")
+    if not sep:
+        return None
+    try:
+        expires_at, delta, tags = orjson.loads(header)
+    except (orjson.JSONDecodeError, ValueError):
+        return None
+    return CacheEntry(expires_at, delta, tuple(tags), value)
+
+
+def build_cache_key(namespace: str, parts: Any) -> str:
+    """
+    Key có độ dài cố định: "cache:{namespace}:{blake2b(parts)}".
+    parts được serialize bằng orjson (hỗ trợ str/int/UUID/datetime/list/dict...), nên hai bộ tham số
+    khác nhau không thể cho cùng một chuỗi như khi nối str().
+    """
+    digest = hashlib.blake2b(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+    return f"cache:{namespace[:100]}:{digest}"
+
+
+def _dump_value(response: Any, model: Optional[Type[BaseModel]]) -> bytes:
+    if response is None:
+        return b"null"
+    if model is not None:
+        return response.model_dump_json().encode("utf-8")
+    # Kiểu cơ bản đi thẳng qua orjson, còn lại (pydantic, ...) mới dùng jsonable_encoder
+    return orjson.dumps(response, default=jsonable_encoder)
+
+
+def _load_value(value: bytes, model: Optional[Type[BaseModel]]) -> Any:
+    if value == b"null":
+        return None
+    if model is not None:
+        return model.model_validate_json(value)
+    return orjson.loads(value)
+
+
+response_cache = TwoTierCache(
+    client=redis_client,
+    local=LocalCache(
+        max_entries=settings.CACHE_L1_MAX_ENTRIES,
+        max_bytes=settings.CACHE_L1_MAX_BYTES,
+        ttl_seconds=settings.CACHE_L1_TTL_SECONDS,
+    ),
+    channel=settings.CACHE_INVALIDATION_CHANNEL,
+    lock_timeout_seconds=settings.CACHE_LOCK_TIMEOUT_SECONDS,
+    tag_ttl_seconds=settings.CACHE_TAG_TTL_SECONDS,
+)
+
+
+def cache_response(
+    expire_time_seconds: int = 60,
+    single_flight: bool = True,
+    early_refresh_beta: float = 0.0,
+    stale_ttl_seconds: int = 0,
+    tags: Optional[Callable[..., Iterable[str]]] = None,
+    key: Optional[Callable[..., Any]] = None,
+    model: Optional[Type[BaseModel]] = None,
+):
+    """
+    Cache kết quả hàm async (L1 + Redis).
+
+    - key: hàm nhận các tham số của hàm gốc (theo tên) và trả về phần định danh của key (str, số, UUID,
+      list...), vd. key=lambda user_id, **_: user_id. Mặc định dùng mọi tham số trừ db session; tham số
+      không serialize được bằng orjson thì lời gọi không được cache (cần khai báo key).
+    - model: pydantic model của kết quả. Kết quả được lưu bằng model_dump_json() và dựng lại bằng
+      model_validate_json() khi hit, nên cả hit lẫn miss đều trả về instance của model (ORM object được
+      chuyển qua model_validate). Không có model: lưu bằng orjson, hit trả về dict/list.
+    - single_flight: khi miss, chỉ một caller cho mỗi key chạy hàm gốc, các caller khác chờ kết quả đó.
+    - early_refresh_beta > 0: làm mới sớm theo xác suất (XFetch) trước khi hết hạn, xác suất tăng dần
+      khi gần hết hạn và theo thời gian tính của hàm; 1.0 là giá trị khởi đầu hợp lý.
+    - stale_ttl_seconds > 0: stale-while-revalidate — giá trị đã hết hạn không quá stale_ttl_seconds được
+      trả ngay, một task nền làm mới. Task nền dùng lại args của request, nên chỉ bật cho hàm không phụ
+      thuộc tài nguyên theo request (vd. db session).
+    - tags: hàm nhận các tham số của hàm gốc (theo tên) và trả về danh sách tag của entry,
+      vd. tags=lambda user_id, **_: [f"user:{user_id}"]; xóa bằng invalidate_tags("user:...").
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        namespace = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            # Chỉ lỗi của tầng cache (tạo key, đọc/giải mã entry) mới fallback sang gọi thẳng hàm gốc.
+            # Lỗi của chính hàm gốc ở nhánh miss bên dưới được trả nguyên cho caller: không gọi lại hàm
+            # cho từng caller đang chờ, nên single-flight vẫn bảo vệ DB cả khi DB đang lỗi.
+            cache_key: Optional[str] = None
+            try:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = bound.arguments
+                if key is not None:
+                    key_parts = key(**arguments)
+                else:
+                    key_parts = {
+                        name: value for name, value in arguments.items()
+                        if not isinstance(value, (AsyncSession, Session))
+                    }
+                try:
+                    cache_key = build_cache_key(namespace, key_parts)
+                except TypeError as e:
+                    logger.warning(f"Cannot build cache key for {func.__name__}, calling without cache: {e}")
+                if cache_key is not None:
+                    entry_tags = tuple(tags(**arguments)) if tags is not None else ()
+                    # Thử lấy từ cache (L1 rồi đến Redis)
+                    entry = decode_entry(await response_cache.get(cache_key))
             except Exception as e:
                 logger.error(f"Unexpected cache wrapper error ({func.__name__}): {str(e)}")
                 # Fallback to original function for other unexpected errors
+                cache_key = None
+            if cache_key is None:
                 return await func(*args, **kwargs)
 
+            async def load():
+                started = time.monotonic()
+                response = await func(*args, **kwargs)
+                if model is not None and response is not None and not isinstance(response, model):
+                    response = model.model_validate(response)
+                try:
+                    value = _dump_value(response, model)
+                except TypeError as e:
+                    logger.error(f"Could not serialize response for caching ({func.__name__}): {e}")
+                    return response, None # Trả về response gốc nếu không thể serialize
+                payload = encode_entry(value, time.time() + expire_time_seconds, time.monotonic() - started, entry_tags)
+                await response_cache.set(cache_key, payload, expire_time_seconds + stale_ttl_seconds, entry_tags)
+                logger.debug(f"Cached result for {func.__name__} - key: {cache_key}")
+                return response, payload
+
+            if entry is not None:
+                try:
+                    now = time.time()
+                    if now < entry.expires_at:
+                        # XFetch: -delta * beta * ln(rand) với rand trong (0, 1]
+                        refresh_early = early_refresh_beta > 0 and (
+                            now - entry.delta * early_refresh_beta * math.log(1.0 - random.random()) >= entry.expires_at
+                        )
+                        if not refresh_early:
+                            logger.debug(f"Cache hit for {func.__name__} - key: {cache_key}")
+                            return _load_value(entry.value, model)
+                        if stale_ttl_seconds > 0:
+                            response_cache.refresh_in_background(cache_key, load)
+                            return _load_value(entry.value, model)
+                        logger.debug(f"Early refresh for {func.__name__} - key: {cache_key}")
+                    elif now < entry.expires_at + stale_ttl_seconds:
+                        logger.debug(f"Serving stale value for {func.__name__} - key: {cache_key}")
+                        response_cache.refresh_in_background(cache_key, load)
+                        return _load_value(entry.value, model)
+                except Exception as e:
+                    # Entry hỏng (vd. không khớp model): coi như miss
+                    logger.warning(f"Discarding unreadable cache entry for {func.__name__} - key: {cache_key}: {e}")
+
+            # Nếu không có trong cache (hoặc cần làm mới), gọi hàm gốc
+            logger.debug(f"Cache miss for {func.__name__} - key: {cache_key}")
+            if not single_flight:
+                response, _ = await load()
+                return response
+            response, payload, leader = await response_cache.load(cache_key, load)
+            if payload is None:
+                # Không serialize được: chỉ leader có kết quả, caller khác tự gọi hàm gốc
+                return response if leader else await func(*args, **kwargs)
+            if leader and response is not None:
+                return response
+            # Caller chờ, hoặc leader nhận giá trị do worker khác vừa tính
+            return _load_value(decode_entry(payload).value, model)
+
         return wrapper
 
     return decorator
 
 
-async def invalidate_cache(pattern: str):
-    """Xóa cache theo pattern"""
-    if not redis_client:
-        logger.warning("Redis client not available, skipping cache invalidation.")
-        return
-
+async def invalidate_tags(*tags: str):
+    """Xóa mọi entry gắn một trong các tag ở cả L1 (mọi worker) và Redis"""
     try:
-        # Sử dụng scan_iter để hiệu quả hơn với lượng key lớn
-        async for key in redis_client.scan_iter(match=pattern):
-            await redis_client.delete(key)
-            logger.info(f"Invalidated cache key: {key}")
-        # Hoặc giữ nguyên keys() nếu số lượng key không quá lớn
-        # keys = await redis_client.keys(pattern)
-        # if keys:
-        #     deleted_count = await redis_client.delete(*keys)
-        #     logger.info(f"Invalidated {deleted_count} cache keys matching pattern: {pattern}")
-    except aioredis.RedisError as e:
-        logger.error(f"Redis error during cache invalidation (pattern: {pattern}): {e}")
+        await response_cache.invalidate_tags(tags)
     except Exception as e:
-         logger.error(f"Unexpected error during cache invalidation (pattern: {pattern}): {e}")
\ No newline at end of file
+         logger.error(f"Unexpected error during cache invalidation (tags: {tags}): {e}")
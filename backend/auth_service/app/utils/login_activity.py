@@ -0,0 +1,160 @@
+# app/utils/login_activity.py
+import asyncio
+import itertools
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.config import get_settings
+from app.core.database import async_engine
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class LastLoginWriter:
+    """
+    Ghi last_login theo kiểu write-behind.
+
+    - Đăng nhập thành công chỉ ghi (user_id -> thời điểm) vào buffer trong bộ nhớ, không mở transaction.
+    - Task nền gom buffer và ghi bằng một câu UPDATE ... FROM (VALUES ...) cho mỗi batch, mỗi
+      `flush_interval_seconds`, hoặc sớm hơn khi buffer đạt `max_pending` user.
+    - Lỗi khi ghi: trả các giá trị về buffer để lần sau ghi lại. Shutdown: ghi nốt phần còn lại.
+    - Buffer không vượt quá `max_buffered` user (vd. DB lỗi kéo dài): bỏ các entry cũ nhất, đếm vào `dropped`.
+    - Mất tối đa một chu kỳ flush nếu process bị kill đột ngột; last_login chỉ mang tính thông tin.
+    """
+
+    def __init__(self, flush_interval_seconds: float, max_pending: int, batch_size: int, max_buffered: int):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.max_buffered = max(max_pending, max_buffered)
+        self._pending: dict[uuid.UUID, datetime] = {}
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def record(self, user_id: uuid.UUID, at: Optional[datetime] = None) -> None:
+        # Cột last_login là TIMESTAMP (không timezone): lưu giờ UTC dạng naive
+        at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+        previous = self._pending.get(user_id)
+        if previous is None or at > previous:
+            self._pending[user_id] = at
+        if previous is None:
+            self._trim()
+        if len(self._pending) >= self.max_pending:
+            self._flush_requested.set()
+
+    async def _write_batch(self, batch: list[tuple[uuid.UUID, datetime]]) -> None:
+        values = ", ".join(
+            f"(CAST(:id{i} AS uuid), CAST(:at{i} AS timestamp))" for i in range(len(batch))
+        )
+        params = {}
+        for i, (user_id, at) in enumerate(batch):
+            params[f"id{i}"] = user_id
+            params[f"at{i}"] = at
+        async with async_engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "UPDATE users AS u SET last_login = v.last_login "
+                    f"FROM (VALUES {values}) AS v(id, last_login) "
+                    # Không ghi đè giá trị mới hơn (vd. từ worker khác)
+                    "WHERE u.id = v.id AND (u.last_login IS NULL OR u.last_login < v.last_login)"
+                ),
+                params
+            )
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                try:
+                    await self._write_batch(batch)
+                    self.flushed += len(batch)
+                except asyncio.CancelledError:
+                    # Bị hủy giữa chừng (shutdown): lần flush cuối trong stop() sẽ ghi lại, UPDATE là idempotent
+                    self._restore(items[start:])
+                    raise
+                except Exception as e:
+                    self.failures += 1
+                    logger.error(f"Failed to flush {len(batch)} last_login updates, will retry: {e}")
+                    self._restore(items[start:])
+                    return
+
+    def _restore(self, items: list[tuple[uuid.UUID, datetime]]) -> None:
+        # Trả lại buffer phía trước các giá trị ghi thêm trong lúc flush (cũ nhất đứng đầu, bị bỏ trước);
+        # user đăng nhập lại trong lúc ghi giữ giá trị mới hơn và vị trí mới hơn
+        restored = dict(items)
+        for user_id, at in self._pending.items():
+            previous = restored.pop(user_id, None)
+            restored[user_id] = at if previous is None or at > previous else previous
+        self._pending = restored
+        self._trim()
+
+    def _trim(self) -> None:
+        # Dict giữ thứ tự chèn: entry đầu tiên là entry cũ nhất
+        excess = len(self._pending) - self.max_buffered
+        if excess <= 0:
+            return
+        for user_id in list(itertools.islice(self._pending, excess)):
+            del self._pending[user_id]
+        self.dropped += excess
+        logger.warning(
+            f"last_login buffer over {self.max_buffered} users, dropped {excess} oldest updates "
+            f"({self.dropped} dropped in total)"
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"last_login flush loop error: {e}")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+last_login_writer = LastLoginWriter(
+    flush_interval_seconds=settings.LAST_LOGIN_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.LAST_LOGIN_MAX_PENDING,
+    batch_size=settings.LAST_LOGIN_BATCH_SIZE,
+    max_buffered=settings.LAST_LOGIN_MAX_BUFFERED,
+)
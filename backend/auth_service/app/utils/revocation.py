@@ -0,0 +1,230 @@
+# app/utils/revocation.py
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from app.core.config import get_settings
+from app.utils.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+REVOKED_KEY_PREFIX = "revoked:jti:"
+
+
+def token_identifier(token: str, payload: dict) -> str:
+    """
+    Lấy định danh dùng để thu hồi token.
+
+    Token mới luôn có claim 'jti'; token cũ (phát hành trước khi có jti)
+    được định danh bằng SHA-256 của chính chuỗi token.
+    """
+    jti = payload.get("jti")
+    if jti:
+        return str(jti)
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class BloomFilter:
+    """Bloom filter đơn giản trên bytearray, dùng double hashing từ một digest blake2b."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class TokenRevocationStore:
+    """
+    Kho lưu token đã bị thu hồi.
+
+    - Redis là nguồn dữ liệu chính: mỗi jti là một key có TTL bằng thời gian sống còn lại của token,
+      nên dữ liệu tự dọn dẹp, tồn tại qua restart và được chia sẻ giữa các worker/replica.
+    - Mỗi process giữ một Bloom filter phía trước: nếu jti không có trong filter thì chắc chắn
+      chưa bị thu hồi, không cần gọi Redis. Filter được đồng bộ qua Redis pub/sub.
+    - Nếu không có Redis, store hoạt động ở chế độ cục bộ (chỉ trong process hiện tại).
+    """
+
+    def __init__(
+        self,
+        client: Optional[aioredis.Redis],
+        channel: str,
+        bloom_capacity: int,
+        bloom_error_rate: float,
+        rebuild_interval_seconds: int,
+    ):
+        self.client = client
+        self.channel = channel
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.rebuild_interval_seconds = rebuild_interval_seconds
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        # jti -> thời điểm hết hạn (epoch), dùng khi Redis không khả dụng
+        self._local: dict[str, float] = {}
+        # jti thu hồi trong lúc rebuild() đang quét Redis, mỗi lần rebuild đang chạy một set
+        self._rebuild_pending: list[set[str]] = []
+        self._listener_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Nạp filter từ Redis và bắt đầu lắng nghe sự kiện thu hồi."""
+        await self.rebuild()
+        if self.client and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    async def rebuild(self) -> None:
+        """
+        Dựng lại Bloom filter từ các key còn hiệu lực trong Redis.
+        Bloom filter không xóa được phần tử, nên việc dựng lại định kỳ loại bỏ các jti đã hết hạn.
+        """
+        bloom = BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        now = time.time()
+        self._local = {jti: exp for jti, exp in self._local.items() if exp > now}
+        for jti in self._local:
+            bloom.add(jti)
+
+        pending: set[str] = set()
+        self._rebuild_pending.append(pending)
+        try:
+            if self.client:
+                try:
+                    async for key in self.client.scan_iter(match=f"{REVOKED_KEY_PREFIX}*", count=1000):
+                        bloom.add(key[len(REVOKED_KEY_PREFIX):])
+                except aioredis.RedisError as e:
+                    logger.error(f"Redis error while rebuilding revocation filter: {e}")
+                    # Giữ các phần tử của filter cũ để không bỏ sót token đã thu hồi
+                    return
+            # jti thu hồi trong lúc quét chỉ nằm ở filter cũ -> thêm vào filter mới trước khi thay thế
+            # (không có await giữa bước này và phép gán nên không lọt sự kiện nào)
+            for jti in pending:
+                bloom.add(jti)
+            self.bloom = bloom
+        finally:
+            self._rebuild_pending.remove(pending)
+
+    def _add_to_filter(self, jti: str) -> None:
+        self.bloom.add(jti)
+        for pending in self._rebuild_pending:
+            pending.add(jti)
+
+    async def revoke(self, jti: str, expires_at: Optional[float]) -> None:
+        """Thu hồi một token cho đến khi nó hết hạn."""
+        now = time.time()
+        ttl = int(math.ceil(expires_at - now)) if expires_at else settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400
+        if ttl <= 0:
+            # Token đã hết hạn, không cần lưu
+            return
+
+        self._add_to_filter(jti)
+        self._local[jti] = now + ttl
+
+        if not self.client:
+            return
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.setex(f"{REVOKED_KEY_PREFIX}{jti}", ttl, 1)
+                pipe.publish(self.channel, json.dumps({"jti": jti, "exp": now + ttl}))
+                await pipe.execute()
+        except aioredis.RedisError as e:
+            logger.error(f"Redis error while revoking token {jti}: {e}")
+
+    async def is_revoked(self, jti: str) -> bool:
+        """
+        Kiểm tra token đã bị thu hồi chưa.
+        Trường hợp phổ biến (không có trong filter) trả về ngay mà không cần network round trip.
+        """
+        if jti not in self.bloom:
+            return False
+
+        local_exp = self._local.get(jti)
+        if local_exp is not None and local_exp > time.time():
+            return True
+
+        if not self.client:
+            return False
+        try:
+            return bool(await self.client.exists(f"{REVOKED_KEY_PREFIX}{jti}"))
+        except aioredis.RedisError as e:
+            # Fail closed: filter báo có thể đã thu hồi nhưng không xác nhận được
+            logger.error(f"Redis error while checking revocation for {jti}: {e}")
+            return True
+
+    async def _listen(self) -> None:
+        """Lắng nghe kênh pub/sub để cập nhật filter khi worker/replica khác thu hồi token."""
+        last_rebuild = time.monotonic()
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # Có thể đã lỡ sự kiện khi mất kết nối -> dựng lại filter
+                await self.rebuild()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get("type") == "message":
+                        try:
+                            event = json.loads(message["data"])
+                            self._add_to_filter(event["jti"])
+                        except (ValueError, KeyError, TypeError):
+                            logger.warning(f"Ignoring malformed revocation event: {message['data']}")
+                    if time.monotonic() - last_rebuild >= self.rebuild_interval_seconds:
+                        await self.rebuild()
+                        last_rebuild = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Revocation listener error, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+def _revocation_client() -> Optional[aioredis.Redis]:
+    if not settings.REVOCATION_REDIS_URL:
+        return redis_client
+    try:
+        return aioredis.from_url(settings.REVOCATION_REDIS_URL, encoding='utf-8', decode_responses=True)
+    except Exception as e:
+        logger.error(f"Could not connect to revocation Redis at {settings.REVOCATION_REDIS_URL}: {e}")
+        return None
+
+
+revocation_store = TokenRevocationStore(
+    client=_revocation_client(),
+    channel=settings.REVOCATION_CHANNEL,
+    bloom_capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    bloom_error_rate=settings.REVOCATION_BLOOM_ERROR_RATE,
+    rebuild_interval_seconds=settings.REVOCATION_REBUILD_INTERVAL_SECONDS,
+)
@@ -1,7 +1,12 @@
 # app/utils/security.py
+import asyncio
 import logging
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
+from fastapi import HTTPException, status
 from jose import jwt
 
 # Cập nhật đường dẫn import
@@ -11,6 +16,8 @@ from app.core.config import get_settings
 logging.getLogger("passlib").setLevel(logging.ERROR)
 from passlib.context import CryptContext
 
+logger = logging.getLogger(__name__)
+
 
 settings = get_settings() # Gọi hàm để lấy đối tượng settings
 
@@ -33,14 +40,76 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+class PasswordHashPool:
+    """
+    Pool riêng cho bcrypt để không chặn event loop.
+
+    Số yêu cầu đang chạy + đang chờ bị giới hạn ở workers + max_queue; khi vượt quá,
+    yêu cầu mới bị từ chối ngay với 503 + Retry-After thay vì xếp hàng vô hạn.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int, retry_after_seconds: int):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, max_queue)
+        self.retry_after_seconds = retry_after_seconds
+        self.in_flight = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, func, *args):
+        # Chỉ có một event loop mỗi worker nên bộ đếm không cần lock
+        if self.in_flight >= self.capacity:
+            logger.warning(f"Password hash pool saturated ({self.in_flight}/{self.capacity}), rejecting request.")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry later",
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hash_pool = PasswordHashPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    retry_after_seconds=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS,
+)
+
+
+async def ahash_password(password: str) -> str:
+    return await password_hash_pool.run(hash_password, password)
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex}) # jti dùng để thu hồi token
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
@@ -7,12 +7,15 @@ from starlette.middleware.cors import CORSMiddleware
 
 # Cập nhật đường dẫn import
 from app.api.routes import auth
-from app.core.database import engine, Base, SessionLocal
+from app.core.database import engine, Base, AsyncSessionLocal, async_engine
 from app.core.config import get_settings
 from sqlalchemy.sql import text
 
 from app.models.schemas import ServiceHealth, HealthCheck, ServicesStatus # Cập nhật đường dẫn import
-from app.utils.cache import cache_response, redis_client # Cập nhật đường dẫn import
+from app.utils.cache import redis_client, response_cache # Cập nhật đường dẫn import
+from app.utils.revocation import revocation_store
+from app.utils.login_activity import last_login_writer
+from app.utils.security import password_hash_pool
 
 
 settings = get_settings() # Lấy settings instance
@@ -28,7 +31,15 @@ async def lifespan(app: FastAPI):
         print("Database tables created successfully (if they didn't exist).")
     except Exception as e:
         print(f"Error creating database tables during startup: {e}")
+    await revocation_store.start() # Nạp Bloom filter thu hồi token và lắng nghe pub/sub
+    await response_cache.start() # Lắng nghe sự kiện invalidation để xóa cache L1
+    await last_login_writer.start() # Ghi last_login theo lô
     yield
+    await last_login_writer.stop() # Ghi nốt last_login còn trong buffer trước khi đóng engine
+    await response_cache.stop()
+    await revocation_store.stop()
+    await async_engine.dispose() # Đóng các connection trong pool async
+    password_hash_pool.shutdown()
     # Logic chạy sau khi ứng dụng kết thúc (shutdown)
     # Ví dụ: đóng kết nối redis nếu cần
     if redis_client:
@@ -37,6 +48,11 @@ async def lifespan(app: FastAPI):
             print("Redis connection closed.")
         except Exception as e:
             print(f"Error closing Redis connection: {e}")
+    if revocation_store.client and revocation_store.client is not redis_client:
+        try:
+            await revocation_store.client.close()
+        except Exception as e:
+            print(f"Error closing revocation Redis connection: {e}")
 
 app = FastAPI(
     title="RumAI Auth Service API", # Cập nhật title
@@ -74,11 +90,10 @@ async def root():
 
 async def check_database() -> ServiceHealth:
     """Kiểm tra kết nối database"""
-    db = None # Khởi tạo db là None
     try:
-        db = SessionLocal()
-        # Sử dụng text() để SQLAlchemy hiểu đây là câu SQL thuần
-        db.execute(text('SELECT 1'))
+        async with AsyncSessionLocal() as db:
+            # Sử dụng text() để SQLAlchemy hiểu đây là câu SQL thuần
+            await db.execute(text('SELECT 1'))
         return ServiceHealth(
             status="healthy",
             details="connected"
@@ -88,9 +103,6 @@ async def check_database() -> ServiceHealth:
             status="unhealthy",
             details=str(e)
         )
-    finally:
-        if db: # Chỉ đóng nếu session được tạo thành công
-            db.close()
 
 
 async def check_redis() -> ServiceHealth:
@@ -117,8 +129,8 @@ async def check_redis() -> ServiceHealth:
     summary="Check Service Health", # Thêm summary
     description="Kiểm tra trạng thái hoạt động của các services phụ thuộc (Database, Redis)."
 )
-@cache_response(expire_time_seconds=60) # Cache kết quả health check
 async def health_check() -> HealthCheck:
+    # Không cache: health check phải phản ánh trạng thái hiện tại (chỉ là SELECT 1 + PING)
     # Kiểm tra các services
     db_health = await check_database()
     redis_health = await check_redis()
@@ -137,7 +149,9 @@ async def health_check() -> HealthCheck:
     return HealthCheck(
         status=overall_status,
         services=services,
-        version=VERSION
+        version=VERSION,
+        cache=response_cache.stats(),
+        last_login=last_login_writer.stats()
     )
 
 # Đăng ký các router
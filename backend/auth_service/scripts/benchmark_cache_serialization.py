@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: cost per cache hit/miss of cache_response serialization and key building.
+
+Compares the previous format (jsonable_encoder + json.dumps, json.loads into a dict,
+str()-joined keys) with the current one (model_dump_json into an entry with an orjson
+header, model_validate_json back into the response model, blake2b-hashed keys).
+No Redis or database is needed.
+
+Usage (from backend/auth_service):
+    python -m scripts.benchmark_cache_serialization
+    python -m scripts.benchmark_cache_serialization --number 50000
+"""
+import argparse
+import json
+import time
+import timeit
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.schemas import CachedUser, HealthCheck, ServiceHealth, ServicesStatus
+from app.utils.cache import build_cache_key, decode_entry, encode_entry, _dump_value, _load_value
+
+
+def _samples():
+    user = CachedUser(
+        id=uuid.uuid4(),
+        username="ivan",
+        email="ivan@example.com",
+        full_name="Ivan Petrov",
+        is_active=True,
+        email_verified=True,
+        last_login=datetime.now(timezone.utc),
+        age=27,
+        gender="male",
+        russian_level="B1",
+        gemini_api_key=None,
+    )
+    health = HealthCheck(
+        status="healthy",
+        services=ServicesStatus(
+            database=ServiceHealth(status="healthy", details="connected"),
+            redis=ServiceHealth(status="healthy", details="connected"),
+        ),
+        version="1.0.0",
+        cache={"l1": {"entries": 120, "bytes": 48000, "hits": 9000, "misses": 300, "evictions": 0}},
+    )
+    return {"CachedUser": user, "HealthCheck": health}
+
+
+def _per_call_us(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1_000_000
+
+
+def run(number: int) -> None:
+    print(f"{'case':<36} | {'previous us':>12} | {'current us':>11}")
+    print("-" * 66)
+    for name, value in _samples().items():
+        model = type(value)
+        old_payload = json.dumps(jsonable_encoder(value))
+        new_payload = encode_entry(_dump_value(value, model), time.time() + 60, 0.01, (f"user:{uuid.uuid4()}",))
+
+        encode_old = _per_call_us(lambda: json.dumps(jsonable_encoder(value)), number)
+        encode_new = _per_call_us(
+            lambda: encode_entry(_dump_value(value, model), time.time() + 60, 0.01, ()), number
+        )
+        # Cũ: hit trả về dict; mới: hit trả về instance của model
+        decode_old = _per_call_us(lambda: json.loads(old_payload), number)
+        decode_new = _per_call_us(lambda: _load_value(decode_entry(new_payload).value, model), number)
+        decode_old_model = _per_call_us(lambda: model.model_validate(json.loads(old_payload)), number)
+
+        print(f"{name + ' encode (miss)':<36} | {encode_old:>12.2f} | {encode_new:>11.2f}")
+        print(f"{name + ' decode (hit)':<36} | {decode_old:>12.2f} | {decode_new:>11.2f}")
+        print(f"{name + ' decode into model (hit)':<36} | {decode_old_model:>12.2f} | {decode_new:>11.2f}")
+        print(f"{name + ' payload bytes':<36} | {len(old_payload):>12} | {len(new_payload):>11}")
+
+    user_id = str(uuid.uuid4())
+    key_old = _per_call_us(lambda: ":".join(["get_user_by_id", user_id]), number)
+    key_new = _per_call_us(lambda: build_cache_key("app.services.auth_service.get_user_by_id", user_id), number)
+    print(f"{'key build':<36} | {key_old:>12.2f} | {key_new:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20_000, help="Calls per timing run")
+    args = parser.parse_args()
+    run(args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import time
+import uuid
+
+from app.utils.cache import LocalCache, build_cache_key, decode_entry, encode_entry
+
+
+def test_local_cache_get_set_and_ttl():
+    cache = LocalCache(max_entries=10, max_bytes=1024, ttl_seconds=30)
+    cache.set("k", b"v", ttl_seconds=60)
+    assert cache.get("k") == b"v"
+    cache.set("short", b"v", ttl_seconds=0)
+    assert cache.get("short") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_local_cache_evicts_lru_by_count_and_bytes():
+    cache = LocalCache(max_entries=2, max_bytes=10, ttl_seconds=30)
+    cache.set("a", b"1", 60)
+    cache.set("b", b"2", 60)
+    cache.get("a") # "b" becomes least recently used
+    cache.set("c", b"3", 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1"
+    cache.set("big", b"123456789", 60)
+    assert cache.stats()["bytes"] <= 10
+    cache.set("too-big", b"x" * 11, 60)
+    assert cache.get("too-big") is None
+
+
+def test_local_cache_invalidate_tags():
+    cache = LocalCache(max_entries=10, max_bytes=1024, ttl_seconds=30)
+    cache.set("profile:1", b"p1", 60, ("user:1",))
+    cache.set("email:1", b"e1", 60, ("user:1", "user_email:a@b.c"))
+    cache.set("profile:2", b"p2", 60, ("user:2",))
+    assert cache.invalidate_tags(["user:1"]) == 2
+    assert cache.get("profile:1") is None
+    assert cache.get("email:1") is None
+    assert cache.get("profile:2") == b"p2"
+    # Tag index is cleaned up together with the entries
+    assert cache.invalidate_tags(["user_email:a@b.c"]) == 0
+
+
+def test_local_cache_overwrite_replaces_tags():
+    cache = LocalCache(max_entries=10, max_bytes=1024, ttl_seconds=30)
+    cache.set("k", b"v1", 60, ("old",))
+    cache.set("k", b"v2", 60, ("new",))
+    assert cache.invalidate_tags(["old"]) == 0
+    assert cache.invalidate_tags(["new"]) == 1
+
+
+def test_entry_round_trip():
+    expires_at = time.time() + 60
+    payload = encode_entry(b'{"id":1}', expires_at, 0.25, ("user:1",))
+    entry = decode_entry(payload)
+    assert entry.value == b'{"id":1}'
+    assert entry.expires_at == expires_at
+    assert entry.delta == 0.25
+    assert entry.tags == ("user:1",)
+    assert decode_entry(b"legacy json without header") is None
+    assert decode_entry(None) is None
+
+
+def test_build_cache_key_is_stable_and_unambiguous():
+    user_id = uuid.uuid4()
+    key = build_cache_key("ns", {"b": 1, "a": user_id})
+    assert key == build_cache_key("ns", {"a": user_id, "b": 1})
+    assert key.startswith("cache:ns:")
+    assert build_cache_key("ns", ["a:b", "c"]) != build_cache_key("ns", ["a", "b:c"])
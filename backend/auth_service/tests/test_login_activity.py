@@ -0,0 +1,52 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.utils.login_activity import LastLoginWriter
+
+T0 = datetime(2026, 1, 1)
+
+
+def _writer(max_pending=100, max_buffered=100):
+    return LastLoginWriter(flush_interval_seconds=5, max_pending=max_pending, batch_size=10, max_buffered=max_buffered)
+
+
+def test_record_keeps_latest_naive_utc():
+    writer = _writer()
+    user_id = uuid.uuid4()
+    writer.record(user_id, datetime(2026, 1, 1, 7, tzinfo=timezone(timedelta(hours=7))))
+    writer.record(user_id, T0 - timedelta(hours=1))
+    assert writer._pending[user_id] == T0
+    assert writer._pending[user_id].tzinfo is None
+
+
+def test_record_requests_early_flush():
+    writer = _writer(max_pending=2)
+    writer.record(uuid.uuid4(), T0)
+    assert not writer._flush_requested.is_set()
+    writer.record(uuid.uuid4(), T0)
+    assert writer._flush_requested.is_set()
+
+
+def test_restore_merges_with_newer_logins():
+    writer = _writer()
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    failed = [(a, T0), (b, T0 + timedelta(seconds=1))]
+    # Logins recorded while the failed flush was running
+    writer.record(c, T0 + timedelta(seconds=5))
+    writer.record(a, T0 + timedelta(seconds=10))
+    writer._restore(failed)
+    assert writer._pending == {b: T0 + timedelta(seconds=1), c: T0 + timedelta(seconds=5), a: T0 + timedelta(seconds=10)}
+    # Restored (older) entries come first, so they are dropped first
+    assert list(writer._pending) == [b, c, a]
+
+
+def test_buffer_is_capped_and_drops_are_counted():
+    writer = _writer(max_pending=2, max_buffered=3)
+    users = [uuid.uuid4() for _ in range(5)]
+    for index, user_id in enumerate(users):
+        writer.record(user_id, T0 + timedelta(seconds=index))
+    assert list(writer._pending) == users[2:]
+    assert writer.stats()["dropped"] == 2
+    writer._restore([(users[0], T0), (users[1], T0)])
+    assert list(writer._pending) == users[2:]
+    assert writer.stats() == {"pending": 3, "flushed": 0, "failures": 0, "dropped": 4}
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from app.utils.revocation import REVOKED_KEY_PREFIX, BloomFilter, TokenRevocationStore, token_identifier
+
+
+class _ScanningClient:
+    """Redis giả: chỉ có scan_iter; gọi on_scan giữa chừng để mô phỏng sự kiện thu hồi đến trong lúc quét."""
+
+    def __init__(self, jtis, on_scan=None):
+        self.jtis = jtis
+        self.on_scan = on_scan
+
+    async def scan_iter(self, match=None, count=None):
+        for index, jti in enumerate(self.jtis):
+            if index == 1 and self.on_scan:
+                self.on_scan()
+            await asyncio.sleep(0)
+            yield f"{REVOKED_KEY_PREFIX}{jti}"
+
+
+def _store(client=None):
+    return TokenRevocationStore(
+        client=client, channel="test", bloom_capacity=1000, bloom_error_rate=0.001, rebuild_interval_seconds=300
+    )
+
+
+def test_token_identifier_prefers_jti():
+    assert token_identifier("token", {"jti": "abc"}) == "abc"
+    assert len(token_identifier("token", {})) == 64
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f"jti-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    false_positives = sum(f"other-{i}" in bloom for i in range(10_000))
+    assert false_positives < 300
+
+
+def test_revoke_without_redis_is_local():
+    async def run():
+        store = _store()
+        assert not await store.is_revoked("a")
+        await store.revoke("a", time.time() + 60)
+        await store.revoke("expired", time.time() - 1)
+        assert await store.is_revoked("a")
+        assert not await store.is_revoked("expired")
+
+    asyncio.run(run())
+
+
+def test_rebuild_keeps_jtis_revoked_during_scan():
+    async def run():
+        store = _store()
+        store.client = _ScanningClient(["a", "b", "c"], on_scan=lambda: store._add_to_filter("late"))
+        await store.rebuild()
+        assert all(jti in store.bloom for jti in ("a", "b", "c", "late"))
+        assert store._rebuild_pending == []
+
+    asyncio.run(run())
+
+
+def test_rebuild_drops_expired_local_entries():
+    async def run():
+        store = _store()
+        store._local = {"old": time.time() - 1, "live": time.time() + 60}
+        await store.rebuild()
+        assert "live" in store.bloom
+        assert "old" not in store._local
+
+    asyncio.run(run())
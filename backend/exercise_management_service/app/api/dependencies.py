@@ -1,11 +1,14 @@
 import asyncpg
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
 from app.core.security import decode_access_token
 from app.models.schemas import TokenData
 from app.core.config import settings # To potentially check against configured admin user
-from app.db.session import get_db_connection # Import the DB connection getter
+from app.db import session
 
 # OAuth2 scheme definition
 # tokenUrl should point to the login endpoint relative to the API root
@@ -40,9 +43,23 @@ async def get_current_admin_user(token: str = Depends(oauth2_scheme)) -> str:
     return token_data.username
 
 # --- Database Dependency ---
+@asynccontextmanager
+async def db_connection() -> AsyncIterator[asyncpg.Connection]:
+    """
+    Acquires a pooled connection for the duration of the block.
+    Raises HTTPException 503 if the pool is not initialized (startup failed or still running).
+    """
+    if session.db_pool is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is not available.",
+        )
+    async with session.db_pool.acquire() as connection:
+        yield connection
+
 async def get_db() -> asyncpg.Connection:
     """Dependency that provides a database connection for a request."""
-    async for connection in get_db_connection():
+    async with db_connection() as connection:
         yield connection
-    # The connection is automatically released by the context manager in get_db_connection
+    # The connection is released when the request finishes
 # --- End Database Dependency ---
\ No newline at end of file
@@ -1,46 +1,55 @@
 import asyncpg
-from fastapi import APIRouter, Depends, HTTPException, status, Path
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query
 from typing import List, Optional
 from datetime import datetime
 
 from app.models.schemas import (
     VocabularyExerciseAdminResponse,
+    VocabularyExerciseAdminPage,
     VocabularyExerciseDBCreate,
     VocabularyExerciseUpdate,
     GenerateExerciseRequest, # Added for the new endpoint
+    GenerationJobStatus,
 )
 from app.api.dependencies import get_current_admin_user, get_db # Added get_db
 from app.services.exercise_generator import generate_exercises_via_gemini # Import the generator service
+from app.services.generation_jobs import generation_jobs
 from app.db import crud_exercises # Import CRUD functions
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # Mock DB removed, will use actual DB calls now
 
-@router.get("/admin/exercises", response_model=List[VocabularyExerciseAdminResponse], tags=["Admin CRUD"])
+@router.get("/admin/exercises", response_model=VocabularyExerciseAdminPage, tags=["Admin CRUD"])
 async def list_exercises_admin(
-    skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, gt=0, le=500),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page's next_cursor"),
     status_filter: Optional[str] = None,
     level_filter: Optional[int] = None, # Add level filter
     topic_filter: Optional[str] = None, # Add topic filter
+    topic_exact: bool = False, # Exact (canonical) topic match instead of substring
     current_admin: str = Depends(get_current_admin_user), # Protected route
     db: asyncpg.Connection = Depends(get_db) # Inject DB connection
 ):
     """
-    List vocabulary exercises for admin view.
+    List vocabulary exercises for admin view, newest first, with cursor pagination.
     """
-    # This part seems correct from the file content, no change needed here.
-    # Re-affirming the correct code:
-    exercises = await crud_exercises.get_exercises(
-        conn=db,
-        skip=skip,
-        limit=limit,
-        status_filter=status_filter,
-        level_filter=level_filter,
-        topic_filter=topic_filter
-    )
-    return exercises
+    try:
+        exercises, next_cursor = await crud_exercises.get_exercises(
+            conn=db,
+            limit=limit,
+            cursor=cursor,
+            status_filter=status_filter,
+            level_filter=level_filter,
+            topic_filter=topic_filter,
+            topic_exact=topic_exact
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return VocabularyExerciseAdminPage(items=exercises, next_cursor=next_cursor)
 
 @router.post("/admin/exercises", response_model=VocabularyExerciseAdminResponse, status_code=status.HTTP_201_CREATED, tags=["Admin CRUD"])
 async def create_exercise_admin(
@@ -117,6 +126,7 @@ async def generate_new_exercises_admin(
 ):
     """
     Generate new vocabulary exercises using the Gemini service and add them to the DB.
+    Blocks until generation finishes; for large counts use POST /admin/generation-jobs.
     """
     # Removed duplicated docstring lines
     # Corrected code block:
@@ -124,29 +134,15 @@ async def generate_new_exercises_admin(
         # Call the generator service
         generated_items = await generate_exercises_via_gemini(generation_request)
 
-        newly_added_exercises = []
-        # Process and save generated items to DB
-        for item in generated_items:
-            try:
-                # Validate and structure data for DB insertion
-                exercise_data = VocabularyExerciseDBCreate(
-                    level=generation_request.level,
-                    topic=generation_request.topic,
-                    russian_content=item.get("russian", "N/A"),
-                    vietnamese_translation=item.get("vietnamese", "N/A"),
-                    options=item.get("options", []),
-                    correct_answer=item.get("correct_answer", "N/A"),
-                    explanation=item.get("explanation"),
-                    status='pending'
-                )
-                # Save to actual DB
-                created_exercise = await crud_exercises.create_exercise(conn=db, exercise=exercise_data)
-                newly_added_exercises.append(created_exercise)
-
-            except Exception as validation_error:
-                # Log error if a specific item fails validation/processing
-                print(f"Skipping item due to error: {validation_error}. Item data: {item}")
-                # Optionally raise an error or continue processing others
+        # Validate + insert the whole batch in one transaction / one round trip
+        newly_added_exercises, rejected = await crud_exercises.create_exercises_bulk(
+            conn=db,
+            items=generated_items,
+            level=generation_request.level,
+            topic=generation_request.topic
+        )
+        for rejection in rejected:
+            logger.warning(f"Skipping generated item {rejection.index}: {rejection.error}")
 
         if not newly_added_exercises:
              raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No valid exercises could be generated or processed.")
@@ -158,4 +154,31 @@ async def generate_new_exercises_admin(
         raise http_exc
     except Exception as e:
         print(f"Error during exercise generation endpoint: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to generate exercises: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to generate exercises: {e}")
+
+
+@router.post("/admin/generation-jobs", response_model=GenerationJobStatus, status_code=status.HTTP_202_ACCEPTED, tags=["Admin CRUD"])
+async def create_generation_job_admin(
+    generation_request: GenerateExerciseRequest,
+    current_admin: str = Depends(get_current_admin_user) # Protected route
+):
+    """
+    Queue an exercise-generation job and return immediately.
+    Exercises are generated in chunks and stored as each chunk completes;
+    poll GET /admin/generation-jobs/{job_id} for progress.
+    """
+    return generation_jobs.submit(generation_request)
+
+
+@router.get("/admin/generation-jobs/{job_id}", response_model=GenerationJobStatus, tags=["Admin CRUD"])
+async def get_generation_job_admin(
+    job_id: str = Path(..., title="The ID of the generation job"),
+    current_admin: str = Depends(get_current_admin_user) # Protected route
+):
+    """
+    Get progress, created exercise IDs and errors of a generation job.
+    """
+    job = generation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Generation job not found")
+    return job
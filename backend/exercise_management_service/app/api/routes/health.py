@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 from app.models.schemas import HealthCheck
+from app.db.statements import statements
 
 router = APIRouter()
 
@@ -9,4 +10,4 @@ async def health_check():
     Health check endpoint. Returns status 'ok' if the service is running.
     """
     # TODO: Add database connection check here later for a more comprehensive health check
-    return HealthCheck()
\ No newline at end of file
+    return HealthCheck(prepared_statements=statements.stats())
\ No newline at end of file
@@ -25,6 +25,32 @@ class Settings(BaseSettings):
 
     # Gemini Service URL (To call the other service)
     GEMINI_SERVICE_URL: str = os.getenv("GEMINI_SERVICE_URL", "http://gemini-service:8001") # Simplified URL without path prefix
+    # Shared HTTP client to the Gemini service (pooled, keep-alive)
+    GEMINI_HTTP2: bool = os.getenv("GEMINI_HTTP2", "true").lower() == "true"
+    GEMINI_HTTP_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_HTTP_TIMEOUT_SECONDS", "120"))
+    GEMINI_HTTP_MAX_CONNECTIONS: int = int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", "20"))
+    GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    GEMINI_HTTP_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("GEMINI_HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    GEMINI_HTTP_MAX_RETRIES: int = int(os.getenv("GEMINI_HTTP_MAX_RETRIES", "3")) # Retries on 429/503 and connection errors, capped per chunk by GENERATION_CHUNK_MAX_ATTEMPTS
+    GEMINI_HTTP_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("GEMINI_HTTP_RETRY_BASE_DELAY_SECONDS", "0.5"))
+    GEMINI_HTTP_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("GEMINI_HTTP_RETRY_MAX_DELAY_SECONDS", "10"))
+
+    # Exercise generation jobs (in-process queue, per worker)
+    GENERATION_JOB_WORKERS: int = int(os.getenv("GENERATION_JOB_WORKERS", "2")) # Max concurrent generation jobs
+    GENERATION_JOB_MAX_QUEUE: int = int(os.getenv("GENERATION_JOB_MAX_QUEUE", "100"))
+    GENERATION_CHUNK_SIZE: int = int(os.getenv("GENERATION_CHUNK_SIZE", "20")) # Exercises per Gemini call
+    GENERATION_MAX_PARALLEL_CHUNKS: int = int(os.getenv("GENERATION_MAX_PARALLEL_CHUNKS", "4")) # Concurrent Gemini calls per generation
+    GENERATION_CHUNK_RETRIES: int = int(os.getenv("GENERATION_CHUNK_RETRIES", "2")) # Retries for failed chunks only
+    # Tổng giới hạn cho một chunk, gộp cả GENERATION_CHUNK_RETRIES và GEMINI_HTTP_MAX_RETRIES (vốn nhân với nhau):
+    # tối đa GENERATION_CHUNK_MAX_ATTEMPTS lần gọi gemini_service và GENERATION_CHUNK_DEADLINE_SECONDS kể cả backoff
+    GENERATION_CHUNK_MAX_ATTEMPTS: int = int(os.getenv("GENERATION_CHUNK_MAX_ATTEMPTS", "6"))
+    GENERATION_CHUNK_DEADLINE_SECONDS: float = float(os.getenv("GENERATION_CHUNK_DEADLINE_SECONDS", "300"))
+    GENERATION_JOB_TTL_SECONDS: int = int(os.getenv("GENERATION_JOB_TTL_SECONDS", "86400")) # Keep finished job status this long
+
+    # In-memory pool of approved exercises for public reads
+    EXERCISE_POOL_ENABLED: bool = os.getenv("EXERCISE_POOL_ENABLED", "true").lower() == "true"
+    EXERCISE_POOL_REFRESH_SECONDS: int = int(os.getenv("EXERCISE_POOL_REFRESH_SECONDS", "30")) # Poll interval when no NOTIFY arrives
+    EXERCISE_POOL_FULL_RELOAD_SECONDS: int = int(os.getenv("EXERCISE_POOL_FULL_RELOAD_SECONDS", "600"))
 
     # JWT Settings
     SECRET_KEY: str = os.getenv("EXERCISE_SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7") # Default, CHANGE THIS!
@@ -1,17 +1,46 @@
 import asyncpg
+import base64
+import json
 import logging
+import random
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 
 from app.models.schemas import (
     VocabularyExerciseDB,
     VocabularyExerciseDBCreate,
     VocabularyExerciseUpdate,
-    VocabularyExerciseAdminResponse # Used for mapping result
+    VocabularyExerciseAdminResponse, # Used for mapping result
+    MixedSetRequestItem,
+    RejectedExercise,
 )
+from pydantic import ValidationError
+
+from app.db.init_db import TOPIC_SLUG_SQL
+from app.db.statements import statements
 
 logger = logging.getLogger(__name__)
 
+def topic_condition(topic: str, exact: bool, placeholder: str) -> tuple[str, str]:
+    """
+    Builds the topic filter and its argument.
+    - exact: canonical topic -> equality on topic_slug (btree index), both sides normalized the same way in SQL.
+    - otherwise: case-insensitive substring match, served by the pg_trgm GIN index.
+    """
+    if exact:
+        return f"topic_slug = {TOPIC_SLUG_SQL.format(placeholder)}", topic
+    return f"topic ILIKE {placeholder}", f"%{topic}%"
+
+# Columns returned to public (non-admin) endpoints
+PUBLIC_EXERCISE_COLUMNS = "id, level, topic, russian_content, options, explanation"
+
+# Postgres NOTIFY channel for admin writes; the in-memory exercise pool LISTENs on it
+EXERCISE_CHANGES_CHANNEL = "exercise_changes"
+
+async def notify_exercise_change(conn: asyncpg.Connection, payload: str = "changed") -> None:
+    """Sends NOTIFY (delivered on commit when called inside a transaction)."""
+    await conn.execute("SELECT pg_notify($1, $2)", EXERCISE_CHANGES_CHANNEL, payload)
+
 # Helper to map asyncpg Record to Pydantic model
 def map_record_to_exercise_db(record: asyncpg.Record) -> VocabularyExerciseAdminResponse:
     # Assuming the schema fields match the column names
@@ -27,43 +56,95 @@ async def get_exercise_by_id(conn: asyncpg.Connection, exercise_id: int) -> Opti
         return map_record_to_exercise_db(record)
     return None
 
+def encode_cursor(created_at: datetime, exercise_id: int) -> str:
+    """Opaque keyset cursor for (created_at, id) of the last row on a page."""
+    payload = json.dumps({"c": created_at.isoformat(), "i": exercise_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+TOPIC_MODES = (None, "contains", "exact")
+
+def _exercise_list_sql(has_cursor: bool, has_status: bool, has_level: bool, topic_mode: Optional[str]) -> str:
+    """Canonical admin listing statement for one filter combination (parameters in a fixed order)."""
+    conditions = []
+    arg_counter = 1
+    if has_cursor:
+        conditions.append(f"(created_at, id) < (${arg_counter}, ${arg_counter + 1})")
+        arg_counter += 2
+    if has_status:
+        conditions.append(f"status = ${arg_counter}")
+        arg_counter += 1
+    if has_level:
+        conditions.append(f"level = ${arg_counter}")
+        arg_counter += 1
+    if topic_mode:
+        conditions.append(topic_condition("", topic_mode == "exact", f"${arg_counter}")[0])
+        arg_counter += 1
+    query = "SELECT * FROM vocabulary_exercises"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return query + f" ORDER BY created_at DESC, id DESC LIMIT ${arg_counter}"
+
+def _exercise_list_statement(has_cursor: bool, has_status: bool, has_level: bool, topic_mode: Optional[str]) -> str:
+    return f"exercises_list:{int(has_cursor)}{int(has_status)}{int(has_level)}:{topic_mode or 'none'}"
+
+for _has_cursor in (False, True):
+    for _has_status in (False, True):
+        for _has_level in (False, True):
+            for _topic_mode in TOPIC_MODES:
+                statements.register(
+                    _exercise_list_statement(_has_cursor, _has_status, _has_level, _topic_mode),
+                    _exercise_list_sql(_has_cursor, _has_status, _has_level, _topic_mode)
+                )
+
 async def get_exercises(
     conn: asyncpg.Connection,
-    skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
     status_filter: Optional[str] = None,
     level_filter: Optional[int] = None,
-    topic_filter: Optional[str] = None
-) -> List[VocabularyExerciseAdminResponse]:
-    """Fetches a list of exercises with optional filters and pagination."""
-    logger.debug(f"Fetching exercises with skip={skip}, limit={limit}, status={status_filter}, level={level_filter}, topic={topic_filter}")
-    base_query = "SELECT * FROM vocabulary_exercises"
-    conditions = []
-    args = []
-    arg_counter = 1
+    topic_filter: Optional[str] = None,
+    topic_exact: bool = False
+) -> tuple[List[VocabularyExerciseAdminResponse], Optional[str]]:
+    """
+    Fetches a page of exercises (newest first) with optional filters.
 
+    Keyset pagination on (created_at, id): the cursor marks the last row of the
+    previous page, so every page is an index range scan of `limit` rows no matter
+    how deep it is. Returns the page and the cursor for the next one (None at the end).
+    Runs one of the pre-registered statements for its filter combination.
+    """
+    logger.debug(f"Fetching exercises with cursor={cursor}, limit={limit}, status={status_filter}, level={level_filter}, topic={topic_filter}, exact={topic_exact}")
+    args = []
+    if cursor:
+        args.extend(decode_cursor(cursor))
     if status_filter:
-        conditions.append(f"status = ${arg_counter}")
         args.append(status_filter)
-        arg_counter += 1
     if level_filter is not None:
-        conditions.append(f"level = ${arg_counter}")
         args.append(level_filter)
-        arg_counter += 1
+    topic_mode = None
     if topic_filter:
-        # Use ILIKE for case-insensitive partial matching
-        conditions.append(f"topic ILIKE ${arg_counter}")
-        args.append(f"%{topic_filter}%")
-        arg_counter += 1
-
-    if conditions:
-        base_query += " WHERE " + " AND ".join(conditions)
-
-    base_query += f" ORDER BY created_at DESC OFFSET ${arg_counter} LIMIT ${arg_counter + 1}"
-    args.extend([skip, limit])
+        topic_mode = "exact" if topic_exact else "contains"
+        args.append(topic_condition(topic_filter, topic_exact, "")[1])
+    # Lấy thêm 1 dòng để biết còn trang sau hay không
+    args.append(limit + 1)
 
-    records = await conn.fetch(base_query, *args)
-    return [map_record_to_exercise_db(record) for record in records]
+    name = _exercise_list_statement(bool(cursor), bool(status_filter), level_filter is not None, topic_mode)
+    records = await statements.fetch(conn, name, *args)
+    exercises = [map_record_to_exercise_db(record) for record in records[:limit]]
+    next_cursor = None
+    if len(records) > limit:
+        last = exercises[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return exercises, next_cursor
 
 
 async def create_exercise(conn: asyncpg.Connection, exercise: VocabularyExerciseDBCreate) -> VocabularyExerciseAdminResponse:
@@ -74,7 +155,7 @@ async def create_exercise(conn: asyncpg.Connection, exercise: VocabularyExercise
         VALUES ($1, $2, $3, $4, $5::jsonb, $6, $7, $8, $9, $10)
         RETURNING *;
     """
-    now = datetime.now(datetime.timezone.utc)
+    now = datetime.now(timezone.utc)
     # Convert options list to JSON string for asyncpg if needed, though it handles lists for jsonb
     # options_json = json.dumps(exercise.options)
 
@@ -95,9 +176,98 @@ async def create_exercise(conn: asyncpg.Connection, exercise: VocabularyExercise
          # This shouldn't happen with RETURNING * unless insert failed silently
          raise RuntimeError("Failed to create exercise, no record returned.")
     logger.info(f"Successfully created exercise with id: {record['id']}")
+    await notify_exercise_change(conn)
     return map_record_to_exercise_db(record)
 
 
+def validate_generated_exercise(item: Dict[str, Any], level: int, topic: str) -> VocabularyExerciseDBCreate:
+    """
+    Maps one AI-generated item to a pending exercise and validates it.
+    Raises ValueError (or pydantic ValidationError) when the item is unusable.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Item is not a JSON object")
+    exercise = VocabularyExerciseDBCreate(
+        level=level,
+        topic=topic,
+        russian_content=item.get("russian"),
+        vietnamese_translation=item.get("vietnamese"),
+        options=item.get("options"),
+        correct_answer=item.get("correct_answer"),
+        explanation=item.get("explanation"),
+        status='pending'
+    )
+    if not exercise.russian_content.strip():
+        raise ValueError("russian is empty")
+    if exercise.correct_answer not in exercise.options:
+        raise ValueError("correct_answer is not one of the options")
+    return exercise
+
+
+async def create_exercises_bulk(
+    conn: asyncpg.Connection,
+    items: List[Dict[str, Any]],
+    level: int,
+    topic: str
+) -> tuple[List[VocabularyExerciseAdminResponse], List[RejectedExercise]]:
+    """
+    Validates a batch of generated items and inserts the valid ones with a single
+    multi-row INSERT ... SELECT FROM unnest(...) RETURNING * inside one transaction.
+
+    Returns the created exercises and the per-item rejects (index in `items` + reason).
+    Either all valid items are stored or none (the transaction rolls back on DB errors).
+    """
+    valid: List[VocabularyExerciseDBCreate] = []
+    rejected: List[RejectedExercise] = []
+    for index, item in enumerate(items):
+        try:
+            valid.append(validate_generated_exercise(item, level, topic))
+        except (ValueError, ValidationError) as e:
+            rejected.append(RejectedExercise(index=index, error=str(e)))
+    if rejected:
+        logger.warning(f"Rejected {len(rejected)} of {len(items)} generated exercises for topic '{topic}'")
+    if not valid:
+        return [], rejected
+
+    query = """
+        INSERT INTO vocabulary_exercises (level, topic, russian_content, vietnamese_translation, options, correct_answer, explanation, status)
+        SELECT level, topic, russian_content, vietnamese_translation, options::jsonb, correct_answer, explanation, status
+        FROM unnest($1::int[], $2::text[], $3::text[], $4::text[], $5::text[], $6::text[], $7::text[], $8::text[])
+            AS t(level, topic, russian_content, vietnamese_translation, options, correct_answer, explanation, status)
+        RETURNING *;
+    """
+    async with conn.transaction():
+        records = await conn.fetch(
+            query,
+            [ex.level for ex in valid],
+            [ex.topic for ex in valid],
+            [ex.russian_content for ex in valid],
+            [ex.vietnamese_translation for ex in valid],
+            [json.dumps(ex.options, ensure_ascii=False) for ex in valid],
+            [ex.correct_answer for ex in valid],
+            [ex.explanation for ex in valid],
+            [ex.status for ex in valid]
+        )
+        await notify_exercise_change(conn)
+    logger.info(f"Bulk-created {len(records)} exercises for topic '{topic}'")
+    return [map_record_to_exercise_db(record) for record in records], rejected
+
+
+UPDATABLE_COLUMNS = ("level", "topic", "russian_content", "vietnamese_translation", "options", "correct_answer", "explanation", "status")
+
+def _update_exercise_sql() -> str:
+    set_clauses = []
+    for index, column in enumerate(UPDATABLE_COLUMNS):
+        flag, value = f"${2 * index + 1}::boolean", f"${2 * index + 2}"
+        if column == "options":
+            value += "::jsonb"
+        set_clauses.append(f"{column} = CASE WHEN {flag} THEN {value} ELSE {column} END")
+    timestamp_param, id_param = 2 * len(UPDATABLE_COLUMNS) + 1, 2 * len(UPDATABLE_COLUMNS) + 2
+    set_clauses.append(f"updated_at = ${timestamp_param}")
+    return f"UPDATE vocabulary_exercises SET {', '.join(set_clauses)} WHERE id = ${id_param} RETURNING *"
+
+UPDATE_EXERCISE_STATEMENT = statements.register("exercise_update", _update_exercise_sql())
+
 async def update_exercise(conn: asyncpg.Connection, exercise_id: int, exercise_update: VocabularyExerciseUpdate) -> Optional[VocabularyExerciseAdminResponse]:
     """Updates an existing exercise."""
     logger.info(f"Updating exercise with id: {exercise_id}")
@@ -112,40 +282,21 @@ async def update_exercise(conn: asyncpg.Connection, exercise_id: int, exercise_u
         # No fields to update, return existing
         return existing
 
-    set_clauses = []
+    # One canonical statement for every combination of fields: ($2k+1) says whether column k is set
     args = []
-    arg_counter = 1
-
-    for key, value in update_data.items():
-        # Special handling for options if needed (e.g., converting to JSON string)
-        if key == "options":
-             set_clauses.append(f"options = ${arg_counter}::jsonb")
-             args.append(value) # Pass list directly
-        else:
-             set_clauses.append(f"{key} = ${arg_counter}")
-             args.append(value)
-        arg_counter += 1
-
-    # Add updated_at timestamp
-    set_clauses.append(f"updated_at = ${arg_counter}")
-    args.append(datetime.now(datetime.timezone.utc))
-    arg_counter += 1
+    for column in UPDATABLE_COLUMNS:
+        value = update_data.get(column)
+        if column == "options" and value is not None:
+            value = json.dumps(value, ensure_ascii=False)
+        args.extend([column in update_data, value])
+    args.extend([datetime.now(timezone.utc), exercise_id])
 
-    # Add the ID for the WHERE clause
-    args.append(exercise_id)
-
-    query = f"""
-        UPDATE vocabulary_exercises
-        SET {', '.join(set_clauses)}
-        WHERE id = ${arg_counter}
-        RETURNING *;
-    """
-
-    record = await conn.fetchrow(query, *args)
+    record = await statements.fetchrow(conn, UPDATE_EXERCISE_STATEMENT, *args)
     if not record:
          # Should not happen if the initial check passed, but good safeguard
          raise RuntimeError(f"Failed to update exercise {exercise_id}, no record returned.")
     logger.info(f"Successfully updated exercise with id: {exercise_id}")
+    await notify_exercise_change(conn)
     return map_record_to_exercise_db(record)
 
 
@@ -156,39 +307,126 @@ async def delete_exercise(conn: asyncpg.Connection, exercise_id: int) -> bool:
     deleted_id = await conn.fetchval(query, exercise_id)
     if deleted_id == exercise_id:
         logger.info(f"Successfully deleted exercise with id: {exercise_id}")
+        await notify_exercise_change(conn, f"delete:{exercise_id}")
         return True
     logger.warning(f"Exercise with id {exercise_id} not found for deletion.")
     return False
 
-# Add functions for public exercise fetching if needed (e.g., filtering only approved, selecting random)
+def _public_sample_sql(has_level: bool, topic_mode: Optional[str]) -> str:
+    """Canonical public sampling statement for one filter combination."""
+    conditions = ["status = 'approved'"] # Always filter by approved
+    arg_counter = 1
+    if has_level:
+        conditions.append(f"level = ${arg_counter}")
+        arg_counter += 1
+    if topic_mode:
+        conditions.append(topic_condition("", topic_mode == "exact", f"${arg_counter}")[0])
+        arg_counter += 1
+    where_clause = " AND ".join(conditions)
+    start_param, limit_param = f"${arg_counter}", f"${arg_counter + 1}"
+    # UNION ALL + outer LIMIT: the wraparound branch only runs if the first one returns fewer than `count` rows
+    return f"""
+        (SELECT {PUBLIC_EXERCISE_COLUMNS} FROM vocabulary_exercises
+         WHERE {where_clause} AND rand_key >= {start_param}
+         ORDER BY rand_key LIMIT {limit_param})
+        UNION ALL
+        (SELECT {PUBLIC_EXERCISE_COLUMNS} FROM vocabulary_exercises
+         WHERE {where_clause} AND rand_key < {start_param}
+         ORDER BY rand_key LIMIT {limit_param})
+        LIMIT {limit_param}
+    """
+
+def _public_sample_statement(has_level: bool, topic_mode: Optional[str]) -> str:
+    return f"public_sample:{int(has_level)}:{topic_mode or 'none'}"
+
+for _has_level in (False, True):
+    for _topic_mode in TOPIC_MODES:
+        statements.register(_public_sample_statement(_has_level, _topic_mode), _public_sample_sql(_has_level, _topic_mode))
+
 async def get_public_exercises_db(
     conn: asyncpg.Connection,
     level: Optional[int] = None,
     topic: Optional[str] = None,
-    count: int = 10
+    count: int = 10,
+    topic_exact: bool = False
 ) -> List[Dict]: # Return dicts to easily exclude fields later
-    """Fetches approved exercises for public view, selecting randomly."""
-    logger.debug(f"Fetching public exercises with level={level}, topic={topic}, count={count}")
-    base_query = "SELECT id, level, topic, russian_content, options, explanation FROM vocabulary_exercises" # Select only needed fields
-    conditions = ["status = 'approved'"] # Always filter by approved
-    args = []
-    arg_counter = 1
+    """
+    Fetches approved exercises for public view, selecting randomly.
 
+    Instead of ORDER BY random() (scan + sort of every matching row), a random
+    start point is picked in [0, 1) and the next `count` rows are read in
+    rand_key order from the partial index, wrapping around to the start of the
+    key space when the tail has fewer rows. Cost is O(log N + count).
+    Neighbouring keys tend to be served together, so the result is shuffled.
+    """
+    logger.debug(f"Fetching public exercises with level={level}, topic={topic}, exact={topic_exact}, count={count}")
+    args = []
     if level is not None:
-        conditions.append(f"level = ${arg_counter}")
         args.append(level)
-        arg_counter += 1
+    topic_mode = None
     if topic:
-        conditions.append(f"topic ILIKE ${arg_counter}")
-        args.append(f"%{topic}%")
-        arg_counter += 1
+        topic_mode = "exact" if topic_exact else "contains"
+        args.append(topic_condition(topic, topic_exact, "")[1])
+    args.extend([random.random(), count])
 
-    base_query += " WHERE " + " AND ".join(conditions)
-    # Use ORDER BY random() for random selection (might be slow on large tables)
-    # Alternatively, fetch more than needed and sample in Python, or use TABLESAMPLE
-    base_query += f" ORDER BY random() LIMIT ${arg_counter}"
-    args.append(count)
-
-    records = await conn.fetch(base_query, *args)
+    name = _public_sample_statement(level is not None, topic_mode)
+    records = await statements.fetch(conn, name, *args)
     # Return as list of dicts for flexibility in route
-    return [dict(record) for record in records]
\ No newline at end of file
+    results = [dict(record) for record in records]
+    random.shuffle(results)
+    return results
+
+
+async def get_mixed_set_exercises_db(
+    conn: asyncpg.Connection,
+    items: List[MixedSetRequestItem]
+) -> List[Dict]:
+    """
+    Resolves a whole MixedSetRequest in one statement / one round trip.
+
+    Items are processed in request order by a recursive CTE: each step samples
+    up to `count` approved rows for its (level, topic) with the same rand_key
+    window + wraparound as get_public_exercises_db, skipping ids already picked
+    by earlier items. This gives global de-duplication and the exact per-item
+    count whenever enough distinct exercises exist (fewer only when the pool
+    is exhausted).
+    """
+    if not items:
+        return []
+    logger.debug(f"Fetching mixed set with {len(items)} items")
+    query = f"""
+        WITH RECURSIVE req AS (
+            SELECT * FROM unnest($1::int[], $2::text[], $3::int[], $4::float8[])
+                WITH ORDINALITY AS r(level, topic_pattern, cnt, start_key, idx)
+        ),
+        chosen(idx, ids) AS (
+            SELECT 0::bigint, ARRAY[]::int[]
+            UNION ALL
+            SELECT r.idx, c.ids || ARRAY(
+                SELECT s.id FROM (
+                    (SELECT id FROM vocabulary_exercises
+                     WHERE status = 'approved' AND level = r.level AND topic ILIKE r.topic_pattern
+                       AND rand_key >= r.start_key AND id <> ALL(c.ids)
+                     ORDER BY rand_key LIMIT r.cnt)
+                    UNION ALL
+                    (SELECT id FROM vocabulary_exercises
+                     WHERE status = 'approved' AND level = r.level AND topic ILIKE r.topic_pattern
+                       AND rand_key < r.start_key AND id <> ALL(c.ids)
+                     ORDER BY rand_key LIMIT r.cnt)
+                    LIMIT r.cnt
+                ) AS s
+            )
+            FROM chosen c
+            JOIN req r ON r.idx = c.idx + 1
+        )
+        SELECT {PUBLIC_EXERCISE_COLUMNS} FROM vocabulary_exercises
+        WHERE id = ANY((SELECT ids FROM chosen ORDER BY idx DESC LIMIT 1))
+    """
+    records = await conn.fetch(
+        query,
+        [item.level for item in items],
+        [f"%{item.topic}%" for item in items],
+        [item.count for item in items],
+        [random.random() for _ in items]
+    )
+    return [dict(record) for record in records]
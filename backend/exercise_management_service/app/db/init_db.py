@@ -27,6 +27,65 @@ CREATE_INDEX_TOPIC_STATUS_SQL = """
 CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_topic_status ON vocabulary_exercises (topic, status);
 """
 
+# Random sampling: each row gets a persisted uniform key in [0, 1); public selection
+# reads a window of the partial indexes starting at a random point instead of ORDER BY random().
+# ADD COLUMN with a volatile default fills existing rows with distinct values.
+ADD_COLUMN_RAND_KEY_SQL = """
+ALTER TABLE vocabulary_exercises ADD COLUMN IF NOT EXISTS rand_key DOUBLE PRECISION NOT NULL DEFAULT random();
+"""
+CREATE_INDEX_APPROVED_RAND_KEY_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_approved_rand_key ON vocabulary_exercises (rand_key) WHERE status = 'approved';
+"""
+CREATE_INDEX_APPROVED_LEVEL_RAND_KEY_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_approved_level_rand_key ON vocabulary_exercises (level, rand_key) WHERE status = 'approved';
+"""
+
+# Admin keyset pagination: ORDER BY created_at DESC, id DESC, optionally filtered by status or level
+CREATE_INDEX_CREATED_ID_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_created_id ON vocabulary_exercises (created_at DESC, id DESC);
+"""
+CREATE_INDEX_STATUS_CREATED_ID_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_status_created_id ON vocabulary_exercises (status, created_at DESC, id DESC);
+"""
+CREATE_INDEX_LEVEL_CREATED_ID_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_level_created_id ON vocabulary_exercises (level, created_at DESC, id DESC);
+"""
+
+# Topic search
+# - topic_slug: canonical form (lowercase, trimmed, single spaces) for the exact-match fast path.
+#   Callers compare against TOPIC_SLUG_SQL applied to the parameter, so both sides use the same normalization.
+# - pg_trgm GIN index so `topic ILIKE '%x%'` (leading wildcard) can use an index.
+TOPIC_SLUG_SQL = "regexp_replace(lower(btrim({})), '\\s+', ' ', 'g')"
+
+ADD_COLUMN_TOPIC_SLUG_SQL = f"""
+ALTER TABLE vocabulary_exercises ADD COLUMN IF NOT EXISTS topic_slug TEXT GENERATED ALWAYS AS ({TOPIC_SLUG_SQL.format('topic')}) STORED;
+"""
+CREATE_INDEX_TOPIC_SLUG_CREATED_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_topic_slug_created ON vocabulary_exercises (topic_slug, created_at DESC, id DESC);
+"""
+CREATE_INDEX_APPROVED_TOPIC_SLUG_RAND_KEY_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_approved_topic_slug_rand_key ON vocabulary_exercises (topic_slug, level, rand_key) WHERE status = 'approved';
+"""
+CREATE_EXTENSION_PG_TRGM_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+"""
+CREATE_INDEX_TOPIC_TRGM_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vocabulary_exercises_topic_trgm ON vocabulary_exercises USING gin (topic gin_trgm_ops);
+"""
+
+async def create_topic_trigram_index(conn: asyncpg.Connection):
+    """
+    Creates the pg_trgm extension and the trigram index on topic.
+    Kept outside the main transaction: CREATE EXTENSION needs extra privileges on
+    managed databases, and without it substring search still works (just unindexed).
+    """
+    try:
+        async with conn.transaction():
+            await conn.execute(CREATE_EXTENSION_PG_TRGM_SQL)
+            await conn.execute(CREATE_INDEX_TOPIC_TRGM_SQL)
+    except asyncpg.PostgresError as e:
+        logger.warning(f"pg_trgm unavailable, topic substring search will not use an index: {e}")
+
 async def create_tables_if_not_exist(conn: asyncpg.Connection):
     """
     Creates the necessary tables and indexes if they don't already exist.
@@ -37,6 +96,16 @@ async def create_tables_if_not_exist(conn: asyncpg.Connection):
             await conn.execute(CREATE_TABLE_SQL)
             await conn.execute(CREATE_INDEX_LEVEL_STATUS_SQL)
             await conn.execute(CREATE_INDEX_TOPIC_STATUS_SQL)
+            await conn.execute(ADD_COLUMN_RAND_KEY_SQL)
+            await conn.execute(CREATE_INDEX_APPROVED_RAND_KEY_SQL)
+            await conn.execute(CREATE_INDEX_APPROVED_LEVEL_RAND_KEY_SQL)
+            await conn.execute(CREATE_INDEX_CREATED_ID_SQL)
+            await conn.execute(CREATE_INDEX_STATUS_CREATED_ID_SQL)
+            await conn.execute(CREATE_INDEX_LEVEL_CREATED_ID_SQL)
+            await conn.execute(ADD_COLUMN_TOPIC_SLUG_SQL)
+            await conn.execute(CREATE_INDEX_TOPIC_SLUG_CREATED_SQL)
+            await conn.execute(CREATE_INDEX_APPROVED_TOPIC_SLUG_RAND_KEY_SQL)
+        await create_topic_trigram_index(conn)
         logger.info("Database tables and indexes checked/created successfully.")
     except Exception as e:
         logger.exception(f"Failed to create database tables/indexes: {e}")
@@ -1,6 +1,7 @@
 import asyncpg
 import logging
 from app.core.config import settings
+from app.db.statements import ExerciseConnection, statements
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,8 @@ async def create_pool():
                 dsn=settings.DATABASE_URL,
                 min_size=5,  # Minimum number of connections in the pool
                 max_size=20, # Maximum number of connections in the pool
+                connection_class=ExerciseConnection, # Holds per-connection prepared statements
+                init=statements.prepare_all, # Prepare hot crud_exercises statements once per connection
                 # Add other pool options if needed, e.g., command_timeout
             )
             logger.info("Database connection pool created successfully.")
@@ -0,0 +1,101 @@
+import logging
+from typing import Dict
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+class ExerciseConnection(asyncpg.Connection):
+    """Pool connection that keeps its own prepared statements, keyed by registry name."""
+
+    __slots__ = ("prepared",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: Dict[str, asyncpg.prepared_stmt.PreparedStatement] = {}
+
+
+class StatementRegistry:
+    """
+    Registry of canonical SQL statements for the hot crud_exercises queries.
+
+    Each filter combination maps to one fixed statement text registered under a
+    name. Statements are prepared once per pool connection (pool `init` hook), so
+    hot reads skip parse/plan; misses (new connection kinds, invalidated plans
+    after a schema change) are prepared lazily. Connections that are not
+    ExerciseConnection (e.g. in scripts) fall back to plain conn.fetch().
+    """
+
+    def __init__(self):
+        self._statements: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reprepares = 0
+
+    def register(self, name: str, sql: str) -> str:
+        existing = self._statements.get(name)
+        if existing is not None and existing != sql:
+            raise ValueError(f"Statement {name} is already registered with different SQL")
+        self._statements[name] = sql
+        return name
+
+    def sql(self, name: str) -> str:
+        return self._statements[name]
+
+    async def prepare_all(self, conn: asyncpg.Connection) -> None:
+        """Pool init hook. Statements that cannot be prepared yet (table not created) are left for lazy preparation."""
+        prepared = getattr(conn, "prepared", None)
+        if prepared is None:
+            return
+        for name, sql in self._statements.items():
+            try:
+                prepared[name] = await conn.prepare(sql)
+            except asyncpg.PostgresError as e:
+                logger.debug(f"Deferring preparation of {name}: {e}")
+
+    async def _statement(self, conn: asyncpg.Connection, name: str):
+        prepared = conn.prepared
+        statement = prepared.get(name)
+        if statement is not None:
+            self.hits += 1
+            return statement
+        self.misses += 1
+        statement = await conn.prepare(self._statements[name])
+        prepared[name] = statement
+        return statement
+
+    async def _run(self, conn: asyncpg.Connection, name: str, method: str, *args):
+        if getattr(conn, "prepared", None) is None:
+            return await getattr(conn, method)(self._statements[name], *args)
+        statement = await self._statement(conn, name)
+        try:
+            return await getattr(statement, method)(*args)
+        except asyncpg.exceptions.InvalidCachedStatementError:
+            # Schema changed under the prepared plan (e.g. ALTER TABLE): prepare again once.
+            # Inside a transaction the error has already aborted it, so retrying cannot help.
+            conn.prepared.pop(name, None)
+            if conn.is_in_transaction():
+                raise
+            self.reprepares += 1
+            statement = await self._statement(conn, name)
+            return await getattr(statement, method)(*args)
+
+    async def fetch(self, conn: asyncpg.Connection, name: str, *args):
+        return await self._run(conn, name, "fetch", *args)
+
+    async def fetchrow(self, conn: asyncpg.Connection, name: str, *args):
+        return await self._run(conn, name, "fetchrow", *args)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "statements": len(self._statements),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reprepares": self.reprepares,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+statements = StatementRegistry()
@@ -36,6 +36,26 @@ class GenerateExerciseRequest(BaseModel):
     count: int = Field(default=10, gt=0, description="Number of exercises to generate")
     topic: str = Field(default="general", description="Topic for the vocabulary")
 
+class GenerationJobStatus(BaseModel):
+    """
+    Status and progress of an asynchronous exercise-generation job.
+    status: 'queued', 'running', 'completed', 'completed_with_errors' or 'failed'
+    """
+    id: str
+    status: str
+    level: int
+    topic: str
+    requested: int # Number of exercises requested
+    created: int = 0 # Exercises stored so far
+    rejected: int = 0 # Generated items that failed validation
+    chunks_total: int
+    chunks_done: int = 0
+    exercise_ids: List[int] = []
+    errors: List[str] = []
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class VocabularyExerciseBase(BaseModel):
     """ Base schema for exercise data in API responses """
     level: int
@@ -67,6 +87,19 @@ class VocabularyExerciseAdminResponse(VocabularyExerciseBase):
     class Config:
         orm_mode = True
 
+class VocabularyExerciseAdminPage(BaseModel):
+    """
+    One page of the admin exercise listing.
+    Pass `next_cursor` back as `cursor` to get the next page; it is null on the last page.
+    """
+    items: List[VocabularyExerciseAdminResponse]
+    next_cursor: Optional[str] = None
+
+class RejectedExercise(BaseModel):
+    """ A generated item that failed validation in a bulk insert """
+    index: int # Position of the item in the submitted batch
+    error: str
+
 class VocabularyExerciseUpdate(BaseModel):
     """ Schema for updating an exercise (Admin) """
     level: Optional[int] = Field(None, ge=1, le=4)
@@ -106,6 +139,7 @@ class HealthCheck(BaseModel):
     Schema for the health check response.
     """
     status: str = "ok"
+    prepared_statements: Dict[str, Any] = {} # Cache-hit metrics of the statement registry
 
 # --- Admin Authentication Schemas ---
 
@@ -1,7 +1,10 @@
+import asyncio
 import httpx
 import json
 import logging
-from typing import List, Dict, Any
+import random
+import time
+from typing import List, Dict, Any, Optional
 
 from app.core.config import settings
 from app.models.schemas import GenerateExerciseRequest, VocabularyExerciseDBCreate # Import necessary schemas
@@ -9,6 +12,118 @@ from fastapi import HTTPException, status
 
 logger = logging.getLogger(__name__)
 
+# Shared client for gemini_service: created on startup, closed on shutdown (see main.py)
+_http_client: Optional[httpx.AsyncClient] = None
+
+# Status codes that mean "try again later" from gemini_service / the gateway in front of it
+RETRYABLE_STATUS_CODES = {status.HTTP_429_TOO_MANY_REQUESTS, status.HTTP_503_SERVICE_UNAVAILABLE}
+
+def _create_http_client() -> httpx.AsyncClient:
+    http2 = settings.GEMINI_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401 - httpx needs the h2 package for HTTP/2
+        except ImportError:
+            logger.warning("GEMINI_HTTP2 is enabled but the 'h2' package is not installed; falling back to HTTP/1.1.")
+            http2 = False
+    return httpx.AsyncClient(
+        base_url=settings.GEMINI_SERVICE_URL,
+        http2=http2,
+        timeout=httpx.Timeout(settings.GEMINI_HTTP_TIMEOUT_SECONDS, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=settings.GEMINI_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GEMINI_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+
+async def start_http_client() -> None:
+    global _http_client
+    if _http_client is None:
+        _http_client = _create_http_client()
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Returns the shared client, creating it lazily if startup did not (e.g. in scripts)."""
+    global _http_client
+    if _http_client is None:
+        _http_client = _create_http_client()
+    return _http_client
+
+class RetryBudget:
+    """
+    Shared limit for every gemini_service call made for one chunk: the HTTP-level retries in
+    _post_with_retry and the chunk-level retries in generate_exercises_via_gemini both draw
+    from it, so a failing chunk makes at most `max_attempts` upstream calls and gives up after
+    `deadline_seconds` (backoff sleeps and request timeouts included).
+    """
+
+    def __init__(self, max_attempts: int, deadline_seconds: float):
+        self.remaining_attempts = max(1, max_attempts)
+        self.deadline = time.monotonic() + deadline_seconds
+
+    def remaining_seconds(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def exhausted(self) -> bool:
+        return self.remaining_attempts <= 0 or self.remaining_seconds() <= 0
+
+    def take(self) -> bool:
+        if self.exhausted():
+            return False
+        self.remaining_attempts -= 1
+        return True
+
+    def allows_retry_after(self, delay: float) -> bool:
+        # Không ngủ nếu sau đó không còn lượt gọi hoặc không còn thời gian cho request tiếp theo
+        return self.remaining_attempts > 0 and delay < self.remaining_seconds()
+
+def _new_chunk_budget() -> RetryBudget:
+    return RetryBudget(settings.GENERATION_CHUNK_MAX_ATTEMPTS, settings.GENERATION_CHUNK_DEADLINE_SECONDS)
+
+def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+    """Full-jitter exponential backoff, honouring a numeric Retry-After header when present."""
+    cap = settings.GEMINI_HTTP_RETRY_MAX_DELAY_SECONDS
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), cap)
+    return random.uniform(0, min(cap, settings.GEMINI_HTTP_RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+
+async def _post_with_retry(path: str, budget: Optional[RetryBudget] = None, **kwargs) -> httpx.Response:
+    """
+    POST to gemini_service, retrying on 429/503 and connection failures with jittered backoff.
+    At most GEMINI_HTTP_MAX_RETRIES retries, and never beyond `budget` (attempts and deadline).
+    """
+    client = get_http_client()
+    budget = budget or _new_chunk_budget()
+    max_retries = settings.GEMINI_HTTP_MAX_RETRIES
+    for attempt in range(max_retries + 1):
+        if not budget.take():
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Retry budget for AI service calls exhausted.")
+        # Request không được kéo dài quá hạn chót của chunk
+        timeout = min(settings.GEMINI_HTTP_TIMEOUT_SECONDS, max(budget.remaining_seconds(), 0.1))
+        try:
+            response = await client.post(path, timeout=httpx.Timeout(timeout, connect=min(10.0, timeout)), **kwargs)
+        except httpx.ConnectError as exc:
+            delay = _retry_delay(attempt, None)
+            if attempt == max_retries or not budget.allows_retry_after(delay):
+                raise
+            logger.warning(f"Could not connect to Gemini service ({exc}), retrying in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+                return response
+            delay = _retry_delay(attempt, response)
+            if not budget.allows_retry_after(delay):
+                return response
+            logger.warning(f"Gemini service returned {response.status_code}, retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
 # Mapping from internal levels (1-4) to CEFR levels for the prompt
 LEVEL_MAP = {
     1: "A1",
@@ -17,15 +132,23 @@ LEVEL_MAP = {
     4: "B2", # Or map 4 to B2/C1 depending on desired difficulty
 }
 
-def _construct_gemini_prompt(params: GenerateExerciseRequest) -> str:
-    """Constructs the prompt for Gemini based on request parameters."""
+def _construct_gemini_prompt(params: GenerateExerciseRequest, part: Optional[tuple[int, int]] = None) -> str:
+    """
+    Constructs the prompt for Gemini based on request parameters.
+    `part` = (index, total) when the request is one chunk of a larger batch.
+    """
     level_cefr = LEVEL_MAP.get(params.level, "A1") # Default to A1 if level is invalid
     count = params.count
     topic = params.topic
+    # Mỗi phần được tạo độc lập, gợi ý để các phần dùng nhóm từ vựng khác nhau
+    part_hint = (
+        f"\nĐây là phần {part[0]}/{part[1]} của một bộ câu hỏi lớn hơn; hãy ưu tiên nhóm từ vựng thứ {part[0]} trong chủ đề, tránh các từ quá phổ biến mà các phần khác có thể đã dùng."
+        if part and part[1] > 1 else ""
+    )
 
     # Reusing the prompt structure from the frontend example
     prompt = f"""Tạo bài kiểm tra từ vựng cho người học tiếng Nga ở trình độ {level_cefr}.
-Vui lòng tạo {count} câu hỏi về chủ đề "{topic}".
+Vui lòng tạo {count} câu hỏi về chủ đề "{topic}".{part_hint}
 
 Vai trò của bạn là thiết kế các bài kiểm tra từ vựng tiếng Nga hiệu quả và phù hợp theo ngữ cảnh với các nguyên tắc sau:
 
@@ -76,12 +199,101 @@ Mỗi câu hỏi nên có một từ/cụm từ/câu tiếng Nga, bản dịch t
 Chỉ trả về mảng JSON, không có văn bản bổ sung nào khác."""
     return prompt
 
-async def generate_exercises_via_gemini(params: GenerateExerciseRequest) -> List[Dict[str, Any]]:
+def _normalize_russian(text: Any) -> str:
+    """Key for de-duplicating generated items: case, whitespace and trailing punctuation insensitive."""
+    return " ".join(str(text or "").lower().split()).strip(" .!?…")
+
+
+async def generate_exercises_via_gemini(
+    params: GenerateExerciseRequest,
+    part_offset: int = 0,
+    part_total: Optional[int] = None,
+    seen: Optional[set[str]] = None
+) -> List[Dict[str, Any]]:
     """
-    Calls the gemini_service to generate vocabulary exercises.
+    Generates `params.count` exercises, splitting large requests into chunks of
+    GENERATION_CHUNK_SIZE that run concurrently (at most GENERATION_MAX_PARALLEL_CHUNKS
+    at a time). Failed chunks are retried up to GENERATION_CHUNK_RETRIES times, within
+    the chunk's RetryBudget (GENERATION_CHUNK_MAX_ATTEMPTS upstream calls and
+    GENERATION_CHUNK_DEADLINE_SECONDS in total, HTTP-level retries included);
+    results are merged and de-duplicated by normalized russian content.
+
+    Args:
+        params: Parameters for this call (level, count, topic).
+        part_offset: Number of chunks of the same batch generated by earlier calls.
+        part_total: Total chunks in the whole batch (defaults to this call's chunk count).
+        seen: Normalized russian content already generated for the batch; updated in place.
+
+    Returns whatever the successful chunks produced (possibly fewer than requested).
+
+    Raises:
+        HTTPException: If every chunk fails (the first chunk's error is re-raised).
+    """
+    chunk_size = max(1, settings.GENERATION_CHUNK_SIZE)
+    counts = [min(chunk_size, params.count - start) for start in range(0, params.count, chunk_size)]
+    total = len(counts)
+    batch_total = max(part_total or 0, part_offset + total)
+    semaphore = asyncio.Semaphore(settings.GENERATION_MAX_PARALLEL_CHUNKS)
+    results: dict[int, List[Dict[str, Any]]] = {}
+    errors: dict[int, HTTPException] = {}
+    budgets: dict[int, RetryBudget] = {}
+
+    async def run_chunk(index: int) -> None:
+        chunk_params = GenerateExerciseRequest(level=params.level, topic=params.topic, count=counts[index])
+        async with semaphore:
+            # Hạn chót tính từ khi chunk thực sự bắt đầu chạy, không tính thời gian chờ semaphore
+            budget = budgets.setdefault(index, _new_chunk_budget())
+            try:
+                results[index] = await _generate_chunk(chunk_params, part=(part_offset + index + 1, batch_total), budget=budget)
+                errors.pop(index, None)
+            except HTTPException as e:
+                errors[index] = e
+
+    pending = list(range(total))
+    for attempt in range(settings.GENERATION_CHUNK_RETRIES + 1):
+        if attempt:
+            logger.warning(f"Retrying {len(pending)} failed chunk(s) of {total} (attempt {attempt + 1})")
+        await asyncio.gather(*(run_chunk(index) for index in pending))
+        # Lỗi cấu hình (500) sẽ không tự hết, chỉ thử lại lỗi từ phía AI service / mạng
+        pending = [
+            index for index, e in errors.items()
+            if e.status_code != status.HTTP_500_INTERNAL_SERVER_ERROR and not budgets[index].exhausted()
+        ]
+        if not pending:
+            break
+
+    if not results:
+        raise errors[min(errors)]
+    if errors:
+        logger.warning(f"{len(errors)} of {total} chunks failed for topic '{params.topic}'; returning partial results.")
+
+    merged: List[Dict[str, Any]] = []
+    if seen is None:
+        seen = set()
+    for index in sorted(results):
+        for item in results[index]:
+            key = _normalize_russian(item.get("russian") if isinstance(item, dict) else item)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(item)
+    if len(merged) < sum(len(items) for items in results.values()):
+        logger.info(f"Dropped {sum(len(items) for items in results.values()) - len(merged)} duplicate items across chunks.")
+    return merged
+
+
+async def _generate_chunk(
+    params: GenerateExerciseRequest,
+    part: Optional[tuple[int, int]] = None,
+    budget: Optional[RetryBudget] = None
+) -> List[Dict[str, Any]]:
+    """
+    Calls the gemini_service once to generate vocabulary exercises.
 
     Args:
         params: Parameters for generation (level, count, topic).
+        part: (index, total) of this chunk within a larger batch.
+        budget: Retry budget shared with the caller's chunk retries.
 
     Returns:
         A list of dictionaries, where each dictionary represents a generated exercise item.
@@ -89,7 +301,7 @@ async def generate_exercises_via_gemini(params: GenerateExerciseRequest) -> List
     Raises:
         HTTPException: If the call to gemini_service fails or returns an error.
     """
-    prompt = _construct_gemini_prompt(params)
+    prompt = _construct_gemini_prompt(params, part)
     gemini_request_payload = {"message": prompt}
     # Optionally add model_name if needed:
     # gemini_request_payload["model_name"] = "specific-model-if-needed"
@@ -104,48 +316,50 @@ async def generate_exercises_via_gemini(params: GenerateExerciseRequest) -> List
          )
 
     headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
-    gemini_service_url = f"{settings.GEMINI_SERVICE_URL}/generate-text" # Updated to use new endpoint path
+    gemini_service_path = "/generate-text" # Relative to GEMINI_SERVICE_URL (client base_url)
 
-    logger.info(f"Calling Gemini Service at {gemini_service_url} for topic '{params.topic}' level {params.level}")
+    logger.info(f"Calling Gemini Service at {settings.GEMINI_SERVICE_URL}{gemini_service_path} for topic '{params.topic}' level {params.level}")
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(gemini_service_url, headers=headers, json=gemini_request_payload, timeout=120.0) # Increased timeout
-            response.raise_for_status() # Raise exception for 4xx or 5xx status codes
+    try:
+        response = await _post_with_retry(gemini_service_path, budget=budget, headers=headers, json=gemini_request_payload)
+        response.raise_for_status() # Raise exception for 4xx or 5xx status codes
 
-            gemini_response = response.json()
-            generated_text = gemini_response.get("result")
+        gemini_response = response.json()
+        generated_text = gemini_response.get("result")
 
-            if not generated_text:
-                logger.error("Gemini service returned an empty result.")
-                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI service returned empty result.")
+        if not generated_text:
+            logger.error("Gemini service returned an empty result.")
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI service returned empty result.")
 
-            # Attempt to parse the generated text as JSON array
-            try:
-                # Find the JSON array within the response text if necessary
-                json_match = json.loads(generated_text) # Assume result is directly the JSON string
-                if isinstance(json_match, list):
-                     logger.info(f"Successfully generated and parsed {len(json_match)} exercises from Gemini.")
-                     return json_match
-                else:
-                     logger.error(f"Gemini service result is not a JSON array: {generated_text[:200]}...")
-                     raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI service returned invalid format (not a JSON array).")
-            except json.JSONDecodeError as json_err:
-                logger.error(f"Failed to parse JSON response from Gemini service: {json_err}. Response text: {generated_text[:500]}...")
-                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Failed to parse AI service response: {json_err}")
-
-        except httpx.RequestError as exc:
-            logger.error(f"HTTP request to Gemini service failed: {exc}")
-            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Could not connect to AI service: {exc}")
-        except httpx.HTTPStatusError as exc:
-            logger.error(f"Gemini service returned error status {exc.response.status_code}: {exc.response.text}")
-            detail = f"AI service error: {exc.response.status_code}"
-            try: # Try to get detail from AI service response
-                 error_detail = exc.response.json().get("detail", exc.response.text)
-                 detail += f" - {error_detail}"
-            except:
-                 pass
-            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=detail)
-        except Exception as e:
-            logger.exception(f"An unexpected error occurred while calling Gemini service: {e}")
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error during AI interaction: {e}")
\ No newline at end of file
+        # Attempt to parse the generated text as JSON array
+        try:
+            # Find the JSON array within the response text if necessary
+            json_match = json.loads(generated_text) # Assume result is directly the JSON string
+            if isinstance(json_match, list):
+                 logger.info(f"Successfully generated and parsed {len(json_match)} exercises from Gemini.")
+                 return json_match
+            else:
+                 logger.error(f"Gemini service result is not a JSON array: {generated_text[:200]}...")
+                 raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="AI service returned invalid format (not a JSON array).")
+        except json.JSONDecodeError as json_err:
+            logger.error(f"Failed to parse JSON response from Gemini service: {json_err}. Response text: {generated_text[:500]}...")
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Failed to parse AI service response: {json_err}")
+
+    except httpx.RequestError as exc:
+        logger.error(f"HTTP request to Gemini service failed: {exc}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Could not connect to AI service: {exc}")
+    except httpx.HTTPStatusError as exc:
+        logger.error(f"Gemini service returned error status {exc.response.status_code}: {exc.response.text}")
+        detail = f"AI service error: {exc.response.status_code}"
+        try: # Try to get detail from AI service response
+             error_detail = exc.response.json().get("detail", exc.response.text)
+             detail += f" - {error_detail}"
+        except:
+             pass
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=detail)
+    except HTTPException:
+        # Lỗi 502 (rỗng/sai định dạng) ở trên phải giữ nguyên để vòng thử lại chunk nhận ra
+        raise
+    except Exception as e:
+        logger.exception(f"An unexpected error occurred while calling Gemini service: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Unexpected error during AI interaction: {e}")
\ No newline at end of file
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import asyncpg
+
+from app.core.config import settings
+from app.db import session
+from app.db.crud_exercises import EXERCISE_CHANGES_CHANNEL, PUBLIC_EXERCISE_COLUMNS
+from app.models.schemas import MixedSetRequestItem, VocabularyExerciseResponse
+
+logger = logging.getLogger(__name__)
+
+# Rows committed slightly out of updated_at order are picked up by re-reading this window
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def normalize_topic(topic: str) -> str:
+    """Same normalization as the topic_slug column: lowercase, trimmed, single spaces."""
+    return " ".join(topic.lower().split())
+
+
+class PooledExercise:
+    """One approved exercise, with its public JSON serialized once at load time."""
+
+    __slots__ = ("id", "level", "topic_slug", "json")
+
+    def __init__(self, id: int, level: int, topic_slug: str, json: bytes):
+        self.id = id
+        self.level = level
+        self.topic_slug = topic_slug
+        self.json = json
+
+
+class ExercisePool:
+    """
+    In-process copy of all approved exercises for the public endpoints.
+
+    - Warmed with one query on startup, then refreshed incrementally by updated_at.
+    - Admin writes in crud_exercises send NOTIFY on EXERCISE_CHANGES_CHANNEL; the
+      listener triggers a refresh immediately (deletes are applied from the payload).
+      Polling every `refresh_seconds` and a full reload every `full_reload_seconds`
+      cover missed notifications.
+    - Indexes (by level, by topic, by level+topic) are rebuilt and swapped as a
+      whole, so readers never see a half-updated pool.
+    """
+
+    def __init__(self, refresh_seconds: int, full_reload_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.ready = False
+        self._by_id: Dict[int, PooledExercise] = {}
+        self._all: List[PooledExercise] = []
+        self._by_level: Dict[int, List[PooledExercise]] = {}
+        self._by_topic: Dict[str, List[PooledExercise]] = {}
+        self._by_level_topic: Dict[tuple, List[PooledExercise]] = {}
+        self._last_updated_at: Optional[datetime] = None
+        self._last_full_reload = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_requested = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._listen_conn: Optional[asyncpg.Connection] = None
+
+    # --- Loading ---
+
+    @staticmethod
+    def _to_record(row: asyncpg.Record) -> PooledExercise:
+        data = dict(row)
+        if isinstance(data["options"], str): # jsonb comes back as text without a type codec
+            data["options"] = json.loads(data["options"])
+        public = VocabularyExerciseResponse(**data)
+        return PooledExercise(public.id, public.level, normalize_topic(public.topic), public.model_dump_json().encode("utf-8"))
+
+    def _reindex(self) -> None:
+        all_records = list(self._by_id.values())
+        by_level: Dict[int, List[PooledExercise]] = {}
+        by_topic: Dict[str, List[PooledExercise]] = {}
+        by_level_topic: Dict[tuple, List[PooledExercise]] = {}
+        for record in all_records:
+            by_level.setdefault(record.level, []).append(record)
+            by_topic.setdefault(record.topic_slug, []).append(record)
+            by_level_topic.setdefault((record.level, record.topic_slug), []).append(record)
+        self._all, self._by_level, self._by_topic, self._by_level_topic = all_records, by_level, by_topic, by_level_topic
+
+    async def full_reload(self) -> None:
+        async with self._refresh_lock:
+            async with session.db_pool.acquire() as conn:
+                # Cùng một snapshot cho cả hai câu: ghi commit xen giữa sẽ có updated_at > max_updated_at
+                # và được refresh() tiếp theo nhặt lên, thay vì bị bỏ sót
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    rows = await conn.fetch(
+                        f"SELECT {PUBLIC_EXERCISE_COLUMNS}, updated_at FROM vocabulary_exercises WHERE status = 'approved'"
+                    )
+                    max_updated_at = await conn.fetchval("SELECT max(updated_at) FROM vocabulary_exercises")
+            self._by_id = {record.id: record for record in map(self._to_record, rows)}
+            self._last_updated_at = max_updated_at
+            self._last_full_reload = time.monotonic()
+            self._reindex()
+            self.ready = True
+            logger.info(f"Exercise pool loaded {len(self._by_id)} approved exercises.")
+
+    async def refresh(self) -> None:
+        """Applies rows changed since the last refresh (approved -> upsert, otherwise -> remove)."""
+        if self._last_updated_at is None or time.monotonic() - self._last_full_reload >= self.full_reload_seconds:
+            await self.full_reload()
+            return
+        async with self._refresh_lock:
+            async with session.db_pool.acquire() as conn:
+                rows = await conn.fetch(
+                    f"SELECT {PUBLIC_EXERCISE_COLUMNS}, status, updated_at FROM vocabulary_exercises WHERE updated_at > $1",
+                    self._last_updated_at - REFRESH_OVERLAP
+                )
+            if not rows:
+                return
+            for row in rows:
+                if row["status"] == "approved":
+                    self._by_id[row["id"]] = self._to_record(row)
+                else:
+                    self._by_id.pop(row["id"], None)
+                self._last_updated_at = max(self._last_updated_at, row["updated_at"])
+            self._reindex()
+
+    # --- Background refresh / LISTEN ---
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        if payload.startswith("delete:"):
+            exercise_id = int(payload.split(":", 1)[1])
+            if self._by_id.pop(exercise_id, None) is not None:
+                self._reindex()
+            return
+        self._refresh_requested.set()
+
+    async def _listen(self) -> None:
+        try:
+            self._listen_conn = await asyncpg.connect(dsn=settings.DATABASE_URL)
+            await self._listen_conn.add_listener(EXERCISE_CHANGES_CHANNEL, self._on_notify)
+        except Exception as e:
+            self._listen_conn = None
+            logger.warning(f"Exercise pool could not LISTEN for changes, relying on polling: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), timeout=self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+            try:
+                if self._listen_conn is None or self._listen_conn.is_closed():
+                    await self._listen()
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Exercise pool refresh failed: {e}")
+
+    async def start(self) -> None:
+        try:
+            await self.full_reload()
+        except Exception as e:
+            # Không chặn startup: các endpoint public sẽ đọc từ DB cho đến khi pool sẵn sàng
+            logger.error(f"Exercise pool warm-up failed, serving public reads from the database: {e}")
+        await self._listen()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._listen_conn is not None:
+            await self._listen_conn.close()
+            self._listen_conn = None
+
+    # --- Reads ---
+
+    def _candidates(self, level: Optional[int], topic: Optional[str], exact_topic: bool) -> List[PooledExercise]:
+        if not topic:
+            return self._all if level is None else self._by_level.get(level, [])
+        slug = normalize_topic(topic)
+        if exact_topic:
+            return self._by_topic.get(slug, []) if level is None else self._by_level_topic.get((level, slug), [])
+        # Substring match như ILIKE '%topic%'
+        source = self._all if level is None else self._by_level.get(level, [])
+        return [record for record in source if slug in record.topic_slug]
+
+    def sample(self, level: Optional[int], topic: Optional[str], count: int, exact_topic: bool = False) -> List[PooledExercise]:
+        candidates = self._candidates(level, topic, exact_topic)
+        return random.sample(candidates, min(count, len(candidates)))
+
+    def mixed_set(self, items: List[MixedSetRequestItem]) -> List[PooledExercise]:
+        """Same semantics as crud_exercises.get_mixed_set_exercises_db: items in order, no duplicates."""
+        picked: List[PooledExercise] = []
+        used_ids = set()
+        for item in items:
+            candidates = [record for record in self._candidates(item.level, item.topic, False) if record.id not in used_ids]
+            chosen = random.sample(candidates, min(item.count, len(candidates)))
+            used_ids.update(record.id for record in chosen)
+            picked.extend(chosen)
+        return picked
+
+    @staticmethod
+    def to_json_array(records: List[PooledExercise]) -> bytes:
+        return b"[" + b",".join(record.json for record in records) + b"]"
+
+
+exercise_pool = ExercisePool(
+    refresh_seconds=settings.EXERCISE_POOL_REFRESH_SECONDS,
+    full_reload_seconds=settings.EXERCISE_POOL_FULL_RELOAD_SECONDS,
+)
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.db import session
+from app.db import crud_exercises
+from app.models.schemas import GenerateExerciseRequest, GenerationJobStatus
+from app.services.exercise_generator import generate_exercises_via_gemini
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationJobQueue:
+    """
+    In-process queue for exercise-generation jobs.
+
+    - POST enqueues a job and returns immediately; `workers` background tasks
+      process jobs, so at most `workers` generations run concurrently per process.
+    - Each job is split into chunks of `chunk_size`; every chunk is generated and
+      bulk-inserted before the next one starts, so progress and created exercises
+      are visible while the job is running.
+    - Job state lives in memory (bounded, finished jobs expire after `ttl_seconds`).
+    """
+
+    def __init__(self, workers: int, max_queue: int, chunk_size: int, ttl_seconds: int, max_jobs: int = 1000):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self._queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queue)
+        self._jobs: "OrderedDict[str, GenerationJobStatus]" = OrderedDict()
+        self._finished_at: dict[str, float] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+            logger.info(f"Started {self.workers} exercise generation workers.")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, request: GenerateExerciseRequest) -> GenerationJobStatus:
+        """Registers and enqueues a job. Raises 503 when the queue is full."""
+        self._prune()
+        job = GenerationJobStatus(
+            id=uuid.uuid4().hex,
+            status="queued",
+            level=request.level,
+            topic=request.topic,
+            requested=request.count,
+            chunks_total=-(-request.count // self.chunk_size),
+            created_at=datetime.now(timezone.utc)
+        )
+        try:
+            self._queue.put_nowait(job.id)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many generation jobs queued, please retry later.",
+                headers={"Retry-After": "30"}
+            )
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[GenerationJobStatus]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        expired = [job_id for job_id, finished in self._finished_at.items() if now - finished > self.ttl_seconds]
+        for job_id in expired:
+            self._finished_at.pop(job_id, None)
+            self._jobs.pop(job_id, None)
+        # Giới hạn bộ nhớ: bỏ các job đã xong cũ nhất trước
+        while len(self._jobs) > self.max_jobs and self._finished_at:
+            oldest = next(job_id for job_id in self._jobs if job_id in self._finished_at)
+            self._finished_at.pop(oldest)
+            self._jobs.pop(oldest)
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Generation worker {worker_id} crashed on job {job_id}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: GenerationJobStatus) -> None:
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        remaining = job.requested
+        # Cả job là một bộ câu hỏi: số phần và tập nội dung đã sinh dùng chung cho mọi bước,
+        # để mỗi chunk có gợi ý riêng và được lọc trùng với các chunk trước
+        part_size = max(1, settings.GENERATION_CHUNK_SIZE)
+        part_total = -(-job.requested // part_size)
+        part_offset = 0
+        seen: set[str] = set()
+        try:
+            while remaining > 0:
+                chunk_count = min(self.chunk_size, remaining)
+                remaining -= chunk_count
+                offset, part_offset = part_offset, part_offset + -(-chunk_count // part_size)
+                try:
+                    items = await generate_exercises_via_gemini(
+                        GenerateExerciseRequest(level=job.level, topic=job.topic, count=chunk_count),
+                        part_offset=offset,
+                        part_total=part_total,
+                        seen=seen
+                    )
+                    async with session.db_pool.acquire() as conn:
+                        created, rejected = await crud_exercises.create_exercises_bulk(
+                            conn=conn, items=items, level=job.level, topic=job.topic
+                        )
+                    job.created += len(created)
+                    job.rejected += len(rejected)
+                    job.exercise_ids.extend(exercise.id for exercise in created)
+                except HTTPException as e:
+                    job.errors.append(f"Chunk {job.chunks_done + 1}: {e.detail}")
+                except Exception as e:
+                    logger.exception(f"Generation job {job.id} chunk failed: {e}")
+                    job.errors.append(f"Chunk {job.chunks_done + 1}: {e}")
+                job.chunks_done += 1
+        except asyncio.CancelledError:
+            job.errors.append("Cancelled: service is shutting down")
+            raise
+        finally:
+            if job.created == 0:
+                job.status = "failed"
+            elif job.errors:
+                job.status = "completed_with_errors"
+            else:
+                job.status = "completed"
+            job.finished_at = datetime.now(timezone.utc)
+            self._finished_at[job.id] = time.monotonic()
+            logger.info(f"Generation job {job.id} {job.status}: {job.created}/{job.requested} created")
+
+
+generation_jobs = GenerationJobQueue(
+    workers=settings.GENERATION_JOB_WORKERS,
+    max_queue=settings.GENERATION_JOB_MAX_QUEUE,
+    # Một bước của job = một lần fan-out song song của exercise_generator
+    chunk_size=settings.GENERATION_CHUNK_SIZE * settings.GENERATION_MAX_PARALLEL_CHUNKS,
+    ttl_seconds=settings.GENERATION_JOB_TTL_SECONDS,
+)
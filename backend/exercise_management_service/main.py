@@ -2,8 +2,12 @@ from fastapi import FastAPI, Depends
 from app.core.config import settings
 from app.api.routes import health, admin_auth, admin_exercises, exercises # Import the new public exercises router
 from app.api.dependencies import get_current_admin_user # Import the dependency
-from app.db.session import create_pool, close_pool, db_pool # Import pool management functions AND the pool variable
+from app.db import session # db_pool is assigned at startup, so read it through the module
+from app.db.session import create_pool, close_pool # Import pool management functions
 from app.db.init_db import create_tables_if_not_exist # Import table creation function
+from app.services.generation_jobs import generation_jobs
+from app.services.exercise_generator import start_http_client, close_http_client
+from app.services.exercise_pool import exercise_pool
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -16,16 +20,25 @@ async def startup_event():
     """Create the database connection pool and tables on startup."""
     await create_pool()
     # Ensure pool was created before trying to create tables
-    if db_pool:
-        async with db_pool.acquire() as conn:
+    if session.db_pool:
+        async with session.db_pool.acquire() as conn:
             await create_tables_if_not_exist(conn)
+        # Connections were prepared before the schema migration ran; recycle them so statements are re-prepared
+        await session.db_pool.expire_connections()
     else:
         # Handle error: pool creation failed, maybe log or raise
         print("ERROR: Database pool not created, cannot initialize tables.")
+    await start_http_client()
+    if session.db_pool and settings.EXERCISE_POOL_ENABLED:
+        await exercise_pool.start()
+    await generation_jobs.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close the database connection pool on shutdown."""
+    await generation_jobs.stop()
+    await exercise_pool.stop()
+    await close_http_client()
     await close_pool()
 # --- End Database Connection Pool Management ---
 
@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from app.db.crud_exercises import (
+    create_exercises_bulk,
+    decode_cursor,
+    encode_cursor,
+    validate_generated_exercise,
+)
+
+
+def _item(**overrides):
+    item = {
+        "russian": "Я ___ студент.",
+        "vietnamese": "Tôi là sinh viên.",
+        "options": ["есть", "был", "буду"],
+        "correct_answer": "есть",
+        "explanation": None,
+    }
+    item.update(overrides)
+    return item
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", encode_cursor(datetime(2026, 1, 1), 1)[:-4]])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_validate_generated_exercise_maps_fields():
+    exercise = validate_generated_exercise(_item(), level=2, topic="study")
+    assert exercise.level == 2
+    assert exercise.topic == "study"
+    assert exercise.russian_content == "Я ___ студент."
+    assert exercise.status == "pending"
+
+
+@pytest.mark.parametrize(
+    "item",
+    [
+        "not an object",
+        _item(russian="   "),
+        _item(correct_answer="нет"),
+        _item(options=None),
+    ],
+)
+def test_validate_generated_exercise_rejects_unusable_items(item):
+    with pytest.raises(ValueError): # pydantic ValidationError is a ValueError
+        validate_generated_exercise(item, level=1, topic="general")
+
+
+def test_create_exercises_bulk_without_valid_items_skips_the_database():
+    items = [_item(correct_answer="нет"), "broken"]
+    # No valid items: the connection must not be touched
+    created, rejected = asyncio.run(create_exercises_bulk(conn=None, items=items, level=1, topic="general"))
+    assert created == []
+    assert [reject.index for reject in rejected] == [0, 1]
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.core.config import settings
+from app.models.schemas import GenerateExerciseRequest
+from app.services import exercise_generator
+from app.services.exercise_generator import RetryBudget
+
+
+def test_retry_budget_caps_attempts():
+    budget = RetryBudget(max_attempts=2, deadline_seconds=60)
+    assert budget.take()
+    assert budget.allows_retry_after(0.1)
+    assert budget.take()
+    assert budget.exhausted()
+    assert not budget.take()
+    assert not budget.allows_retry_after(0.1)
+
+
+def test_retry_budget_deadline():
+    assert RetryBudget(max_attempts=5, deadline_seconds=0).exhausted()
+    budget = RetryBudget(max_attempts=5, deadline_seconds=10)
+    # A backoff sleep that would run past the deadline is not worth taking
+    assert not budget.allows_retry_after(30)
+    assert budget.allows_retry_after(1)
+
+
+def test_retry_budget_allows_at_least_one_attempt():
+    assert RetryBudget(max_attempts=0, deadline_seconds=60).take()
+
+
+def test_generation_numbers_parts_across_calls_and_dedups(monkeypatch):
+    parts = []
+
+    async def fake_chunk(params, part=None, budget=None):
+        parts.append(part)
+        # Parts 1 and 4 return the same content (modulo case/whitespace)
+        russian = "Слово  один" if part[0] in (1, 4) else f"слово {part[0]}"
+        return [{"russian": russian if part[0] != 4 else russian.lower()}]
+
+    monkeypatch.setattr(exercise_generator, "_generate_chunk", fake_chunk)
+    count = settings.GENERATION_CHUNK_SIZE * 2
+    seen = set()
+
+    async def run():
+        first = await exercise_generator.generate_exercises_via_gemini(
+            GenerateExerciseRequest(level=1, topic="t", count=count), part_offset=0, part_total=4, seen=seen
+        )
+        second = await exercise_generator.generate_exercises_via_gemini(
+            GenerateExerciseRequest(level=1, topic="t", count=count), part_offset=2, part_total=4, seen=seen
+        )
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert sorted(parts) == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert len(first) == 2
+    assert [item["russian"] for item in second] == ["слово 3"]
@@ -0,0 +1,93 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from app.db import session
+from app.models.schemas import MixedSetRequestItem
+from app.services.exercise_pool import ExercisePool, normalize_topic
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _row(id, level=1, topic="Food", status="approved", updated_at=T0):
+    return {
+        "id": id,
+        "level": level,
+        "topic": topic,
+        "russian_content": f"слово {id}",
+        "options": json.dumps(["a", "b"]),
+        "explanation": None,
+        "status": status,
+        "updated_at": updated_at,
+    }
+
+
+class _FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fetch_args = []
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        yield
+
+    async def fetch(self, query, *args):
+        self.fetch_args.append(args)
+        return self.rows
+
+    async def fetchval(self, query, *args):
+        return max(row["updated_at"] for row in self.rows)
+
+
+class _FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+
+def _loaded_pool(monkeypatch, rows):
+    connection = _FakeConnection(rows)
+    monkeypatch.setattr(session, "db_pool", _FakePool(connection))
+    pool = ExercisePool(refresh_seconds=60, full_reload_seconds=3600)
+    asyncio.run(pool.full_reload())
+    return pool, connection
+
+
+def test_normalize_topic():
+    assert normalize_topic("  Daily   Life ") == "daily life"
+
+
+def test_full_reload_indexes_approved_rows(monkeypatch):
+    pool, _ = _loaded_pool(monkeypatch, [_row(1), _row(2, level=2, topic="daily  life")])
+    assert pool.ready
+    assert {record.id for record in pool.sample(level=None, topic=None, count=10)} == {1, 2}
+    assert [record.id for record in pool.sample(level=2, topic="Daily Life", count=10, exact_topic=True)] == [2]
+    assert json.loads(pool.to_json_array(pool.sample(level=1, topic=None, count=1)))[0]["id"] == 1
+
+
+def test_refresh_applies_upserts_and_removals(monkeypatch):
+    pool, connection = _loaded_pool(monkeypatch, [_row(1), _row(2), _row(3)])
+    later = T0 + timedelta(minutes=1)
+    connection.rows = [
+        _row(2, status="rejected", updated_at=later), # no longer public
+        _row(3, level=3, updated_at=later), # edited
+        _row(4, updated_at=later), # newly approved
+    ]
+    asyncio.run(pool.refresh())
+    # Incremental query starts from the last seen updated_at, with the overlap window
+    assert connection.fetch_args[-1][0] < T0
+    assert {record.id for record in pool.sample(level=None, topic=None, count=10)} == {1, 3, 4}
+    assert [record.id for record in pool.sample(level=3, topic=None, count=10)] == [3]
+    assert pool._last_updated_at == later
+
+
+def test_mixed_set_does_not_repeat_exercises(monkeypatch):
+    pool, _ = _loaded_pool(monkeypatch, [_row(id) for id in range(1, 6)])
+    items = [MixedSetRequestItem(level=1, topic="food", count=3), MixedSetRequestItem(level=1, topic="food", count=3)]
+    picked = [record.id for record in pool.mixed_set(items)]
+    assert len(picked) == 5
+    assert len(set(picked)) == 5
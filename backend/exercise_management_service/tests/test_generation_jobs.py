@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+
+from app.db import crud_exercises, session
+from app.models.schemas import GenerateExerciseRequest
+from app.services import generation_jobs
+from app.services.generation_jobs import GenerationJobQueue
+
+
+class _FakePool:
+    @asynccontextmanager
+    async def acquire(self):
+        yield None
+
+
+class _Created:
+    def __init__(self, id):
+        self.id = id
+
+
+def test_submit_rejects_when_queue_is_full():
+    async def run():
+        queue = GenerationJobQueue(workers=1, max_queue=1, chunk_size=10, ttl_seconds=60)
+        job = queue.submit(GenerateExerciseRequest(level=1, count=25))
+        assert job.status == "queued"
+        assert job.chunks_total == 3
+        with pytest.raises(HTTPException) as excinfo:
+            queue.submit(GenerateExerciseRequest(level=1, count=5))
+        assert excinfo.value.status_code == 503
+
+    asyncio.run(run())
+
+
+def test_run_stores_each_step_and_records_failures(monkeypatch):
+    calls = []
+
+    async def fake_generate(params, part_offset=0, part_total=None, seen=None):
+        calls.append((params.count, part_offset, part_total))
+        if len(calls) == 2:
+            raise HTTPException(status_code=502, detail="AI service error")
+        return [{"russian": f"слово {len(calls)}"}] * params.count
+
+    async def fake_bulk(conn, items, level, topic):
+        return [_Created(index) for index in range(len(items))], []
+
+    monkeypatch.setattr(generation_jobs, "generate_exercises_via_gemini", fake_generate)
+    monkeypatch.setattr(crud_exercises, "create_exercises_bulk", fake_bulk)
+    monkeypatch.setattr(session, "db_pool", _FakePool())
+    monkeypatch.setattr(generation_jobs.settings, "GENERATION_CHUNK_SIZE", 5)
+
+    async def run():
+        queue = GenerationJobQueue(workers=1, max_queue=5, chunk_size=10, ttl_seconds=60)
+        job = queue.submit(GenerateExerciseRequest(level=1, count=25))
+        await queue._run(job)
+        return job
+
+    job = asyncio.run(run())
+    # Steps of 10, 10, 5 with global part offsets over 5 parts of 5
+    assert calls == [(10, 0, 5), (10, 2, 5), (5, 4, 5)]
+    assert job.created == 15
+    assert job.chunks_done == 3
+    assert job.status == "completed_with_errors"
+    assert job.errors == ["Chunk 2: AI service error"]